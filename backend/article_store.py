@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import config
+
+
+class ArticleStore:
+    """Id-keyed SQLite store of article metadata and their float32 embeddings."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.article_store_path
+        self._lock = threading.Lock()
+        self.generation = 0  # Bumped when articles are written or deleted, used to refresh derived views
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                link TEXT,
+                published TEXT,
+                source TEXT,
+                categories TEXT,
+                embedding BLOB,
+                summary TEXT,
+                cluster_id TEXT
+            )
+        """)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(articles)")}
+        if "summary" not in columns:
+            self._conn.execute("ALTER TABLE articles ADD COLUMN summary TEXT")
+        if "cluster_id" not in columns:
+            self._conn.execute("ALTER TABLE articles ADD COLUMN cluster_id TEXT")
+        # A write counter shared by every process and kept across restarts
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self._conn.commit()
+
+    def _bump_version_locked(self):
+        """Count a write in the same transaction as the write itself."""
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self.generation += 1
+
+    @staticmethod
+    def _row_to_article(row: sqlite3.Row, include_embedding: bool) -> Dict[str, Any]:
+        article = {
+            "id": row["id"],
+            "title": row["title"],
+            "content": row["content"],
+            "link": row["link"],
+            "published": row["published"],
+            "source": row["source"],
+            "categories": json.loads(row["categories"] or "[]")
+        }
+        if row["cluster_id"] is not None:
+            article["cluster_id"] = row["cluster_id"]
+        if include_embedding and row["embedding"] is not None:
+            article["embedding"] = array("f", row["embedding"]).tolist()
+        return article
+
+    def put_many(self, articles: List[Dict[str, Any]]):
+        """Insert or update articles by id, dropping any summary of the previous version.
+
+        An updated article keeps its rowid, so it keeps its place in ``list_page``.
+        """
+        rows = [
+            (
+                article["id"],
+                article["title"],
+                article["content"],
+                article.get("link", ""),
+                article.get("published", ""),
+                article.get("source", ""),
+                json.dumps(article.get("categories", []), ensure_ascii=False),
+                array("f", article["embedding"]).tobytes() if article.get("embedding") else None,
+                article.get("cluster_id")
+            )
+            for article in articles
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO articles "
+                "(id, title, content, link, published, source, categories, embedding, cluster_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title = excluded.title, content = excluded.content, "
+                "link = excluded.link, published = excluded.published, source = excluded.source, "
+                "categories = excluded.categories, embedding = excluded.embedding, "
+                "cluster_id = excluded.cluster_id, summary = NULL",
+                rows
+            )
+            self._bump_version_locked()
+            self._conn.commit()
+
+    def get(self, article_id: str, include_embedding: bool = False) -> Optional[Dict[str, Any]]:
+        """Return the article with this id, or None if it is unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM articles WHERE id = ?", (article_id,)).fetchone()
+        if row is None:
+            return None
+        return self._row_to_article(row, include_embedding)
+
+    def get_many(self, article_ids: List[str], include_embedding: bool = False) -> List[Dict[str, Any]]:
+        """Return the known articles for these ids, in the order of the ids."""
+        if not article_ids:
+            return []
+        placeholders = ",".join("?" * len(article_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM articles WHERE id IN ({placeholders})", list(article_ids)
+            ).fetchall()
+        by_id = {row["id"]: self._row_to_article(row, include_embedding) for row in rows}
+        return [by_id[article_id] for article_id in article_ids if article_id in by_id]
+
+    def get_embeddings(self, article_ids: List[str]) -> Dict[str, List[float]]:
+        """Return the stored embeddings of these ids, skipping unknown ids."""
+        if not article_ids:
+            return {}
+        placeholders = ",".join("?" * len(article_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, embedding FROM articles WHERE id IN ({placeholders}) AND embedding IS NOT NULL",
+                list(article_ids)
+            ).fetchall()
+        return {row["id"]: array("f", row["embedding"]).tolist() for row in rows}
+
+    def list_recent(self, limit: int = None, include_embedding: bool = False) -> List[Dict[str, Any]]:
+        """Return the most recently added articles, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM articles ORDER BY rowid DESC LIMIT ?",
+                (limit or config.recent_articles_limit,)
+            ).fetchall()
+        return [self._row_to_article(row, include_embedding) for row in rows]
+
+    def list_page(self, limit: int, before: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return a page of articles, most recently added first, and the position to pass as ``before`` for the next page.
+
+        Pages are keyed on the rowid rather than an offset, so each page is an
+        index range scan. Updates keep an article's rowid and new articles
+        get higher ones, so writes between pages do not shift them.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid AS position, * FROM articles WHERE rowid < ? ORDER BY rowid DESC LIMIT ?",
+                (before if before is not None else 2 ** 63 - 1, limit + 1)
+            ).fetchall()
+        next_before = rows[limit - 1]["position"] if len(rows) > limit else None
+        return [self._row_to_article(row, include_embedding=False) for row in rows[:limit]], next_before
+
+    def version(self) -> int:
+        """Return the number of writes to the store, by this or any other process, since it was created."""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def get_summary(self, article_id: str) -> Optional[str]:
+        """Return the stored summary of an article, or None if it has not been generated."""
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM articles WHERE id = ?", (article_id,)).fetchone()
+        return row["summary"] if row else None
+
+    def set_summary(self, article_id: str, summary: str):
+        """Store the summary of an article."""
+        with self._lock:
+            self._conn.execute("UPDATE articles SET summary = ? WHERE id = ?", (summary, article_id))
+            self._conn.commit()
+
+    def delete(self, article_id: str):
+        """Remove an article from the store."""
+        self.delete_many([article_id])
+
+    def delete_many(self, article_ids: List[str]):
+        """Remove articles from the store."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM articles WHERE id = ?", [(article_id,) for article_id in article_ids])
+            self._bump_version_locked()
+            self._conn.commit()
+
+    def revert(self, article_ids: List[str], previous: List[Dict[str, Any]]):
+        """Undo a ``put_many`` of these ids: restore the ``previous`` versions and delete the rest.
+
+        ``previous`` comes from ``get_many(..., include_embedding=True)`` before the write.
+        """
+        article_ids = set(article_ids)
+        restored = [article for article in previous if article["id"] in article_ids]
+        restored_ids = {article["id"] for article in restored}
+        self.delete_many([article_id for article_id in article_ids if article_id not in restored_ids])
+        if restored:
+            self.put_many(restored)
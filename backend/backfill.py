@@ -0,0 +1,451 @@
+"""Load the raw_news archive into the index without fetching any feed.
+
+Usage: python backend/backfill.py [--vector-backend local] [--restart]
+
+The ``raw_news_<ts>.json`` snapshots are streamed newest first, so each
+article is loaded once, in its latest version. Batches go through a clean ->
+embed -> store pipeline with a worker pool per stage, connected by bounded
+queues so a slow stage holds back the reader instead of filling memory. Stored
+articles are recorded in a checkpoint database; an interrupted run picks up
+where it stopped, and a run against another embedding model, vector backend
+or index starts over.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import config
+from html_cleaner import clean_html_many
+from search_filters import parse_published
+from seen_articles import SeenArticleIndex, article_fingerprint
+from metrics import html_clean_seconds, ingest_stage_seconds
+
+logger = logging.getLogger('Backfill')
+
+# Articles of a batch with the checkpoint fingerprint of each id
+Batch = Tuple[List[Dict[str, Any]], Dict[str, str]]
+
+_DONE = object()  # Tells a stage worker there are no more batches
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield the objects of a JSON array file one at a time.
+
+    The file is read in chunks and each element is decoded as soon as it is
+    complete, so memory stays bounded by the largest element rather than the
+    file. The elements must be objects or arrays: a number split across two
+    chunks would be decoded early.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = "", 0, False
+    with open(path, "r", encoding="utf-8") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            buffer = buffer[position:] + chunk
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position == len(buffer):
+                    break
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{path} does not hold a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    item, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break  # Incomplete element, read more
+                yield item
+    raise ValueError(f"{path} ends before its JSON array is closed")
+
+
+def snapshot_paths(raw_dir: str) -> List[str]:
+    """Return the raw_news snapshots in a directory, newest first."""
+    names = [
+        name for name in os.listdir(raw_dir)
+        if name.startswith("raw_news_") and name.endswith(".json")
+    ]
+    # The timestamp in the name sorts chronologically
+    return [os.path.join(raw_dir, name) for name in sorted(names, reverse=True)]
+
+
+def normalize_article(record: Dict[str, Any], content: Optional[str] = None) -> Dict[str, Any]:
+    """Return a snapshot record in the shape produced by ``NewsFetcher.parse_feed_entries``."""
+    categories = record.get("categories") or []
+    if isinstance(categories, str):
+        # Some snapshots hold the list serialized as a string
+        try:
+            categories = json.loads(categories)
+        except json.JSONDecodeError:
+            categories = [categories]
+    published = record.get("published") or ""
+    article = {
+        "title": record["title"],
+        "raw_content": record.get("raw_content", ""),
+        "content": record.get("content", "") if content is None else content,
+        "link": record.get("link", ""),
+        "published": published,
+        "published_ts": parse_published(published),
+        "source": record.get("source", "Unknown"),
+        "categories": [str(category) for category in categories],
+        "id": record["id"],
+    }
+    if record.get("published_defaulted"):
+        article["published_defaulted"] = True
+    return article
+
+
+class BackfillCheckpoint:
+    """Ids and fingerprints of the articles a backfill has stored, per target index."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.backfill_checkpoint_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS backfilled (
+                id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def target(self) -> Dict[str, str]:
+        """Return the target the stored progress belongs to."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def reset(self, target: Dict[str, str]):
+        """Forget all progress and record the new target."""
+        with self._lock:
+            self._conn.execute("DELETE FROM backfilled")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", list(target.items()))
+            self._conn.commit()
+
+    def load(self) -> Dict[str, str]:
+        """Return the fingerprint of every stored article by id."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, fingerprint FROM backfilled").fetchall())
+
+    def mark_done(self, entries: List[Tuple[str, str]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO backfilled (id, fingerprint) VALUES (?, ?)", entries
+            )
+            self._conn.commit()
+
+
+def current_target() -> Dict[str, str]:
+    """Describe the index a backfill writes to; progress only carries over to the same target."""
+    index = config.pinecone_index_name if config.vector_backend == "pinecone" else config.local_index_dir
+    return {
+        "embedding_model": config.embedding_model,
+        "vector_backend": config.vector_backend,
+        "index": index,
+    }
+
+
+class Backfill:
+    """Clean -> embed -> store pipeline over the raw_news snapshots."""
+
+    def __init__(
+        self,
+        embedding_generator,
+        vector_store,
+        article_store,
+        lexical_index,
+        seen_index: Optional[SeenArticleIndex] = None,
+        duplicate_index=None,
+        checkpoint: Optional[BackfillCheckpoint] = None,
+        raw_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        workers: Optional[Dict[str, int]] = None,
+        checkpoint_every: Optional[int] = None
+    ):
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        self.article_store = article_store
+        self.lexical_index = lexical_index
+        self.seen_index = seen_index or SeenArticleIndex()
+        self.duplicate_index = duplicate_index
+        self.checkpoint = checkpoint or BackfillCheckpoint()
+        self.raw_dir = raw_dir or config.raw_news_dir
+        self.batch_size = batch_size or config.backfill_batch_size
+        self.queue_size = queue_size or config.backfill_queue_size
+        self.workers = {
+            "clean": config.backfill_clean_workers,
+            "embed": config.backfill_embed_workers,
+            "store": config.backfill_upsert_workers,
+            **(workers or {})
+        }
+        self.checkpoint_every = checkpoint_every or config.backfill_checkpoint_every
+        self.stats: Dict[str, Any] = {
+            "files": 0,
+            "file_errors": 0,
+            "read": 0,
+            "duplicates": 0,
+            "already_done": 0,
+            "embed_failed": 0,
+            "upsert_failed": 0,
+            "stage_failed": 0,
+            "stored": 0,
+        }
+        self._stats_lock = threading.Lock()
+        self._pending: List[Tuple[str, str]] = []
+        self._pending_batches = 0
+        self._checkpoint_lock = threading.Lock()
+        self._dedup_lock = threading.Lock()
+
+    def _count(self, **increments: int):
+        with self._stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def read(self, done: Dict[str, str], limit: Optional[int] = None) -> Iterator[Batch]:
+        """Yield batches of snapshot records that are not stored in their latest version yet."""
+        seen_ids = set()
+        batch: List[Dict[str, Any]] = []
+        fingerprints: Dict[str, str] = {}
+        for path in snapshot_paths(self.raw_dir):
+            self._count(files=1)
+            try:
+                for record in iter_json_array(path):
+                    if not isinstance(record, dict) or not record.get("id") or not record.get("title"):
+                        continue
+                    self._count(read=1)
+                    # Snapshots are read newest first, so an id seen before is an older version
+                    if record["id"] in seen_ids:
+                        self._count(duplicates=1)
+                        continue
+                    seen_ids.add(record["id"])
+                    fingerprint = article_fingerprint(record)
+                    if done.get(record["id"]) == fingerprint:
+                        self._count(already_done=1)
+                        continue
+                    batch.append(record)
+                    fingerprints[record["id"]] = fingerprint
+                    if len(batch) >= self.batch_size:
+                        yield batch, fingerprints
+                        batch, fingerprints = [], {}
+                    if limit is not None and len(seen_ids) >= limit:
+                        break
+            except (OSError, ValueError) as e:
+                logger.error("Error reading %s: %s", path, str(e))
+                self._count(file_errors=1)
+            if limit is not None and len(seen_ids) >= limit:
+                break
+        if batch:
+            yield batch, fingerprints
+
+    def clean(self, batch: Batch) -> Batch:
+        """Re-clean the raw HTML with the current cleaner and normalize the records."""
+        records, fingerprints = batch
+        raw_contents = [record.get("raw_content") or "" for record in records]
+        with html_clean_seconds.time():
+            contents = clean_html_many(raw_contents)
+        articles = [
+            normalize_article(record, content if raw_content else None)
+            for record, raw_content, content in zip(records, raw_contents, contents)
+        ]
+        return articles, fingerprints
+
+    def embed(self, batch: Batch) -> Batch:
+        articles, fingerprints = batch
+        self.embedding_generator.process_articles(articles)
+        return articles, fingerprints
+
+    def _write(self, articles: List[Dict[str, Any]]):
+        """Write articles to the article store and the vector store, reverting those whose upsert failed."""
+        # The article store is written first, so a search never finds a vector without its article
+        previous = self.article_store.get_many([article["id"] for article in articles], include_embedding=True)
+        self.article_store.put_many(articles)
+        upsert = self.vector_store.upsert_articles(articles)
+        if upsert.failed_ids:
+            self.article_store.revert(upsert.failed_ids, previous)
+        return upsert
+
+    def store(self, batch: Batch) -> None:
+        """Upsert a batch and record the articles that made it into every store."""
+        articles, fingerprints = batch
+        embedded = [article for article in articles if "embedding" in article]
+        if self.duplicate_index is not None and embedded:
+            # One batch at a time, so each is assigned against the clusters of those stored before it
+            with self._dedup_lock:
+                self.duplicate_index.assign(embedded)
+                upsert = self._write(embedded)
+                self.duplicate_index.commit(embedded, upsert.upserted_ids)
+        else:
+            upsert = self._write(embedded)
+        upserted_ids = set(upsert.upserted_ids)
+        # Articles that failed to embed or upsert are not checkpointed, so the next run retries them
+        stored = [article for article in embedded if article["id"] in upserted_ids]
+        if stored:
+            self.lexical_index.add_articles(stored)
+            self.seen_index.mark_seen(stored)
+        self._count(
+            embed_failed=len(articles) - len(embedded),
+            upsert_failed=len(upsert.failed_ids),
+            stored=len(stored)
+        )
+        with self._checkpoint_lock:
+            self._pending.extend((article["id"], fingerprints[article["id"]]) for article in stored)
+            self._pending_batches += 1
+            if self._pending_batches >= self.checkpoint_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self.checkpoint.mark_done(self._pending)
+        self._pending, self._pending_batches = [], 0
+
+    def flush(self):
+        """Checkpoint everything stored so far."""
+        with self._checkpoint_lock:
+            self._flush_locked()
+
+    def _worker(self, stage: str, work: Callable[[Batch], Optional[Batch]], inbox: queue.Queue,
+                outbox: Optional[queue.Queue]):
+        while True:
+            batch = inbox.get()
+            if batch is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                result = work(batch)
+            except Exception as e:
+                logger.error("Error in backfill %s stage: %s", stage, str(e))
+                self._count(stage_failed=len(batch[0]))
+                continue
+            finally:
+                ingest_stage_seconds.observe(time.perf_counter() - start, stage=f"backfill_{stage}")
+            if outbox is not None:
+                outbox.put(result)
+
+    def run(self, restart: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Load every snapshot that is not checkpointed yet and return the run's stats."""
+        start = time.perf_counter()
+        target = current_target()
+        if restart or self.checkpoint.target() != target:
+            logger.info("Starting a fresh backfill into %s", target)
+            self.checkpoint.reset(target)
+            done = {}
+        else:
+            done = self.checkpoint.load()
+            logger.info("Resuming backfill, %d articles already stored", len(done))
+
+        stages = [("clean", self.clean), ("embed", self.embed), ("store", self.store)]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        pools = []
+        for i, (stage, work) in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(stages) else None
+            threads = [
+                threading.Thread(target=self._worker, args=(stage, work, queues[i], outbox), daemon=True)
+                for _ in range(max(1, self.workers[stage]))
+            ]
+            for thread in threads:
+                thread.start()
+            pools.append(threads)
+
+        try:
+            for batch in self.read(done, limit):
+                queues[0].put(batch)  # Blocks while the pipeline is full
+            # Close each stage once the one before it has drained
+            for inbox, threads in zip(queues, pools):
+                for _ in threads:
+                    inbox.put(_DONE)
+                for thread in threads:
+                    thread.join()
+        finally:
+            self.flush()
+
+        self.stats["seconds"] = time.perf_counter() - start
+        self.stats["articles_per_second"] = self.stats["stored"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+        return self.stats
+
+
+def build_backfill(raw_dir: Optional[str] = None, **kwargs) -> Backfill:
+    """Build a backfill over the API's shared components."""
+    import components
+    from dedup import DuplicateIndex
+
+    article_store = components.get_article_store()
+    vector_store = components.get_vector_store()
+    duplicate_index = None
+    if config.dedup_enabled:
+        duplicate_index = DuplicateIndex(
+            embedding_lookup=article_store.get_embeddings,
+            neighbor_lookup=vector_store.search_similar
+        )
+    return Backfill(
+        embedding_generator=components.get_embedding_generator(),
+        vector_store=vector_store,
+        article_store=article_store,
+        lexical_index=components.get_lexical_index(),
+        duplicate_index=duplicate_index,
+        raw_dir=raw_dir,
+        **kwargs
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load the raw_news archive into the index.")
+    parser.add_argument("--raw-dir", default=config.raw_news_dir, help="Directory of raw_news_<ts>.json snapshots")
+    parser.add_argument("--vector-backend", choices=["pinecone", "local"], help="Index to load, defaults to VECTOR_BACKEND")
+    parser.add_argument("--embedding-model", help="Embedding model, defaults to the configured one")
+    parser.add_argument("--batch-size", type=int, default=config.backfill_batch_size)
+    parser.add_argument("--clean-workers", type=int, default=config.backfill_clean_workers)
+    parser.add_argument("--embed-workers", type=int, default=config.backfill_embed_workers)
+    parser.add_argument("--upsert-workers", type=int, default=config.backfill_upsert_workers)
+    parser.add_argument("--checkpoint", default=config.backfill_checkpoint_path, help="Checkpoint database")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and load everything again")
+    parser.add_argument("--limit", type=int, help="Stop after this many distinct articles")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Set before any component is built, so they pick up the target
+    if args.vector_backend:
+        config.vector_backend = args.vector_backend
+    if args.embedding_model:
+        config.embedding_model = args.embedding_model
+
+    backfill = build_backfill(
+        raw_dir=args.raw_dir,
+        checkpoint=BackfillCheckpoint(args.checkpoint),
+        batch_size=args.batch_size,
+        workers={"clean": args.clean_workers, "embed": args.embed_workers, "store": args.upsert_workers}
+    )
+    try:
+        stats = backfill.run(restart=args.restart, limit=args.limit)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted: stored articles are checkpointed, run again to resume")
+        return 130
+    finally:
+        # Keeps the last_used times of the cache hits, which decide what is evicted
+        if backfill.embedding_generator.cache is not None:
+            backfill.embedding_generator.cache.flush()
+    logger.info(
+        "Stored %d articles from %d files in %.1fs (%.1f/s): %d older versions, %d already stored, "
+        "%d failed to embed, %d failed to upsert, %d failed in a stage",
+        stats["stored"], stats["files"], stats["seconds"], stats["articles_per_second"],
+        stats["duplicates"], stats["already_done"], stats["embed_failed"],
+        stats["upsert_failed"], stats["stage_failed"]
+    )
+    return 0 if not (stats["embed_failed"] or stats["upsert_failed"] or stats["stage_failed"]) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,48 @@
+import threading
+from typing import Any, Callable, Dict
+
+from config import config
+
+# The SDKs are imported on first use: together they add about a second to startup
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _shared(name: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def set_client(name: str, client: Any):
+    """Replace a shared client, e.g. with an offline fake, before anything uses it."""
+    with _lock:
+        _clients[name] = client
+
+
+def cohere_client():
+    """Return the process-wide Cohere client; its HTTP connection pool is shared by every caller."""
+    def build():
+        import cohere
+        return cohere.Client(config.cohere_api_key)
+    return _shared("cohere", build)
+
+
+def pinecone_client():
+    """Return the process-wide Pinecone client."""
+    def build():
+        from pinecone import Pinecone
+        return Pinecone(api_key=config.pinecone_api_key)
+    return _shared("pinecone", build)
+
+
+def groq_client():
+    """Return the process-wide Groq client."""
+    def build():
+        from groq import Groq
+        return Groq(api_key=config.groq_api_key)
+    return _shared("groq", build)
@@ -0,0 +1,120 @@
+"""Process-wide components of the API, built on first use.
+
+Importing the API must not construct clients or touch the network, so each
+component is created by its getter the first time a request (or ``warmup``)
+needs it, and shared from then on. Modules are imported inside the getters
+for the same reason.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config import config
+
+_components: Dict[str, Any] = {}
+_lock = threading.RLock()  # Reentrant: building a component builds the components it depends on
+
+
+def _shared(name: str, factory: Callable[[], Any]) -> Any:
+    # Check membership rather than truthiness: an empty vector store or lexical index is falsy
+    if name not in _components:
+        with _lock:
+            if name not in _components:
+                _components[name] = factory()
+    return _components[name]
+
+
+def existing(name: str) -> Optional[Any]:
+    """Return a component if it has been built, without building it."""
+    return _components.get(name)
+
+
+def get_vector_store():
+    from vector_store import create_vector_store
+    return _shared("vector_store", lambda: create_vector_store(article_store=get_article_store()))
+
+
+def get_article_store():
+    from article_store import ArticleStore
+    return _shared("article_store", ArticleStore)
+
+
+def get_lexical_index():
+    from lexical_index import BM25Index
+    return _shared("lexical_index", BM25Index)
+
+
+def get_embedding_generator():
+    from embeddings import EmbeddingGenerator
+    return _shared("embedding_generator", EmbeddingGenerator)
+
+
+def get_recommender():
+    from recommender import NewsRecommender
+    return _shared("recommender", NewsRecommender)
+
+
+def get_news_fetcher():
+    def build():
+        from news_fetcher import NewsFetcher
+        return NewsFetcher(
+            embedding_generator=get_embedding_generator(),
+            vector_store=get_vector_store(),
+            article_store=get_article_store(),
+            lexical_index=get_lexical_index(),
+            recommender=get_recommender() if config.precompute_summaries else None
+        )
+    return _shared("news_fetcher", build)
+
+
+def get_service():
+    def build():
+        from services import AsyncNewsService
+        return AsyncNewsService(
+            get_embedding_generator(),
+            get_vector_store(),
+            get_recommender(),
+            get_article_store(),
+            get_lexical_index()
+        )
+    return _shared("service", build)
+
+
+def get_scheduler():
+    def build():
+        from jobs import JobScheduler
+        # The fetcher is built by the first job rather than with the scheduler
+        return JobScheduler(lambda: get_news_fetcher().process())
+    return _shared("scheduler", build)
+
+
+def warmup():
+    """Build every component and resolve the clients and index ahead of the first request."""
+    start = time.perf_counter()
+    try:
+        get_service()
+        get_news_fetcher()
+        get_vector_store().warmup()
+        get_embedding_generator().client
+        get_recommender().client
+        print(f"Warmed up in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"Error warming up: {str(e)}")
+
+
+def shutdown():
+    """Stop the scheduler and the service executor if they were started, and flush the embedding cache.
+
+    The scheduler and the executor are dropped from the registry, so a later request builds fresh ones.
+    """
+    with _lock:
+        scheduler = _components.pop("scheduler", None)
+        service = _components.pop("service", None)
+    if scheduler is not None:
+        scheduler.stop(timeout=5)
+    if service is not None:
+        service.shutdown()
+    embedding_generator = existing("embedding_generator")
+    if embedding_generator is not None and embedding_generator.cache is not None:
+        # Runs after the scheduler stopped, so no ingest is still recording hits
+        embedding_generator.cache.flush()
@@ -16,9 +16,116 @@ class Config:
 
     # Pinecone Configuration
     pinecone_index_name: str = os.getenv("PINECONE_INDEX_NAME", "news-articles")
+    pinecone_store_content: bool = os.getenv("PINECONE_STORE_CONTENT", "false").lower() == "true"  # Else text is read from the article store
+    pinecone_upsert_batch_size: int = 100  # Records per upsert request
+    pinecone_upsert_max_bytes: int = 2 * 1024 * 1024 - 64 * 1024  # Under Pinecone's 2 MB request limit
+    pinecone_upsert_concurrency: int = 4
+    pinecone_upsert_max_retries: int = 3
+    pinecone_upsert_retry_backoff: float = 1.0  # Seconds, doubled on every retry
     vector_dimension: int = 1024  # Cohere embedding dimension
     top_k_results: int = 5
 
+    # Vector Backend Configuration
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "pinecone")  # "pinecone" or "local"
+    local_index_dir: str = "data/vector_index"
+    ivf_min_vectors: int = 10000  # Corpus size at which the local backend trains an IVF index
+    ivf_n_probe: int = 8  # Number of IVF clusters scanned per query
+    local_index_compact_min_rows: int = 5000  # Rows in delta files before the local index is rewritten
+    local_index_compact_ratio: float = 0.5  # Or this fraction of the last full snapshot, whichever is larger
+
+    # Lexical and Hybrid Search
+    lexical_index_path: str = "data/lexical_index.json"
+    lexical_index_compact_min_entries: int = 5000  # Log lines before the lexical index is rewritten
+    lexical_index_compact_ratio: float = 0.5  # Or this fraction of the indexed documents, whichever is larger
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    bm25_title_weight: int = 2  # Title tokens are counted this many times
+    rrf_k: int = 60  # Reciprocal rank fusion constant
+    hybrid_candidates: int = 20  # Candidates taken from each retriever before fusion
+    lexical_fast_path_max_terms: int = 3  # Queries this short skip the embedding call when BM25 finds matches
+
+    # Query Caching
+    query_cache_enabled: bool = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    query_embedding_cache_size: int = 4096  # Normalized query strings mapped to their embedding
+    query_result_cache_size: int = 1024  # Query embeddings mapped to their search results
+    query_result_cache_ttl: float = 600  # Seconds, bounds staleness when another process writes the index
+    query_result_similarity_threshold: float = float(os.getenv("QUERY_RESULT_SIMILARITY_THRESHOLD", "1"))  # Below 1, near-duplicate queries share results
+
+    # Near-Duplicate Detection
+    dedup_enabled: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    dedup_path: str = "data/duplicates.db"  # MinHash signatures, LSH buckets and cluster ids
+    dedup_shingle_size: int = 3  # Words per shingle
+    minhash_num_perm: int = 128
+    lsh_bands: int = 32  # 4 rows per band, so pairs above ~0.45 Jaccard usually share a bucket
+    dedup_jaccard_threshold: float = 0.8  # Estimated Jaccard that marks a syndicated copy
+    dedup_cosine_threshold: float = 0.92  # Embedding cosine that marks a rewrite of the same story
+    dedup_max_candidates: int = 50  # LSH candidates verified per article
+    dedup_embedding_neighbors: int = 3  # Vector store neighbours checked for rewrites, 0 disables
+    dedup_neighbor_workers: int = 4  # Concurrent neighbour lookups per batch
+    dedup_overfetch: int = 3  # Search results fetched per returned result before collapsing clusters
+
+    # Personalization
+    users_db_path: str = "data/users.db"  # Users, their view/click events and interest vectors
+    interest_half_life: float = 7 * 24 * 3600  # Seconds for an event's weight in the interest vector to halve
+    interest_view_weight: float = 1.0
+    interest_click_weight: float = 3.0
+    feed_size: int = 10  # Articles returned by /feed
+    feed_candidates: int = 2000  # Newest articles ranked for a feed, kept in memory
+    feed_refresh_seconds: float = 60  # Reload candidates at least this often, for writers in other processes
+    feed_diversity: float = 0.3  # MMR trade-off between relevance and novelty, 0 disables re-ranking
+    feed_mmr_pool_factor: int = 4  # Top candidates per feed slot considered by MMR
+    feed_seen_limit: int = 500  # Recent events whose articles are left out of the feed
+
+    # Embedding Configuration
+    embedding_model: str = "embed-english-v3.0"
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_path: str = "data/embedding_cache.db"
+    embedding_cache_max_entries: int = 100000
+    embedding_cache_touch_batch: int = 1000  # Hits whose last_used is kept in memory before being written
+    embedding_batch_size: int = 96  # Cohere's per-request text limit
+    embedding_max_concurrency: int = 4
+    embedding_max_retries: int = 3
+    embedding_retry_backoff: float = 1.0  # Seconds, doubled on every retry
+    embedding_requests_per_minute: int = 100  # 0 disables rate limiting
+
+    # LLM Configuration
+    llm_model: str = "llama3-70b-8192"
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_ttl: float = 24 * 3600  # Seconds
+    llm_cache_max_entries: int = 1024  # In-memory tier
+    llm_cache_disk: bool = True
+    llm_cache_path: str = "data/llm_cache.db"
+    precompute_summaries: bool = os.getenv("PRECOMPUTE_SUMMARIES", "false").lower() == "true"
+    stream_insights: bool = os.getenv("STREAM_INSIGHTS", "false").lower() == "true"  # Default of /recommend-news?stream
+    summary_workers: int = 4  # Concurrent summary requests during ingest
+    llm_context_tokens: int = 8192  # Context window of llm_model, prompt and completion together
+    llm_chars_per_token: float = 4.0  # Used to estimate prompt sizes without a tokenizer
+    summary_max_content_tokens: int = 1000  # Article content beyond this is cut, keeping the lead
+    summary_batch_prompt_tokens: int = 4000  # Articles packed into one batch summary prompt, in tokens
+    summary_batch_max_articles: int = 10
+    summary_tokens_per_article: int = 150  # Completion budget of each summary in a batch
+
+    # Request Handling
+    service_workers: int = 32  # Threads for blocking client calls made by request handlers
+    recent_articles_limit: int = 60  # Articles shown by /fetch-news
+    warmup_on_startup: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"  # Build clients in the background at startup
+
+    # JSON API
+    api_page_size: int = 20  # Default page size of the /api/v1 endpoints
+    api_max_page_size: int = 100
+    api_max_results: int = 100  # Deepest search or recommendation result reachable by paging
+    api_cache_max_age: int = 0  # Seconds clients may reuse a response before revalidating its ETag
+    api_gzip_min_size: int = 1024  # Bytes; smaller responses are not worth compressing
+    api_gzip_level: int = 6
+
+    # Observability
+    profiling_enabled: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"  # Allows ?profile=1 on any route
+    profiler_interval: float = 0.005  # Seconds between stack samples
+
+    # Ingest Scheduling
+    ingest_interval_seconds: float = float(os.getenv("INGEST_INTERVAL_SECONDS", "0"))  # 0 disables periodic ingest
+    job_history_size: int = 100  # Finished jobs kept for /jobs/{job_id}
+
     # News Sources
     rss_feeds: List[str] = field(default_factory=lambda: [
         # "https://feeds.feedburner.com/TechCrunch/",
@@ -27,9 +134,31 @@ class Config:
         "https://www.technologyreview.com/feed/",
     ])
 
+    # Feed Fetching
+    feed_concurrency_per_host: int = 4
+    feed_max_connections: int = 100
+    feed_timeout: float = 30.0
+    html_clean_cache_size: int = 10000  # Cleaned texts kept in memory, keyed by raw HTML digest
+    html_clean_workers: int = 1  # Processes used by clean_html_many for large batches
+    html_clean_parallel_threshold: int = 500  # Minimum batch size worth a process pool
+    feed_state_path: str = "data/feed_state.json"  # ETag/Last-Modified validators per feed
+    seen_articles_path: str = "data/seen_articles.db"  # Ids and fingerprints of ingested articles
+    article_store_path: str = "data/articles.db"  # Article metadata and embeddings keyed by id
+
     # Data Directories
     raw_news_dir: str = "data/raw_news"
     processed_news_dir: str = "data/processed_news"
+    processed_max_segments: int = 16  # Segments kept before processed articles are compacted
+    processed_retention_days: float = 0  # 0 keeps processed articles forever
+
+    # Backfill
+    backfill_checkpoint_path: str = "data/backfill_checkpoint.db"  # Articles already loaded from raw_news
+    backfill_batch_size: int = 96  # Articles per pipeline batch, one embedding request
+    backfill_queue_size: int = 8  # Batches buffered between pipeline stages
+    backfill_clean_workers: int = 2
+    backfill_embed_workers: int = 4
+    backfill_upsert_workers: int = 2
+    backfill_checkpoint_every: int = 10  # Stored batches between checkpoint commits
 
     def __post_init__(self):
         # Create directories if they don't exist
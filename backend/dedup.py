@@ -0,0 +1,318 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+
+import numpy as np
+
+from config import config
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Smallest prime above 2**32, the modulus of the universal hashes (a * x + b) mod p
+HASH_PRIME = np.uint64(4294967311)
+# Bumped when signatures change, so older ones are dropped instead of compared
+SIGNATURE_VERSION = 2
+
+
+def shingles(text: str, size: Optional[int] = None) -> set:
+    """Return the set of lowercase word n-grams of a text."""
+    size = size or config.dedup_shingle_size
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over 32-bit shingle hashes with fixed, seeded permutations."""
+
+    def __init__(self, num_perm: Optional[int] = None, seed: int = 1):
+        self.num_perm = num_perm or config.minhash_num_perm
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, self.num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)),
+            dtype=np.uint64
+        )
+        if not len(hashes):
+            return np.full(self.num_perm, HASH_PRIME, dtype=np.uint64)
+        # a * x reaches 2**64 and would wrap, so x is split into 16-bit halves to keep
+        # every intermediate product below 2**50
+        high = np.outer(hashes >> np.uint64(16), self._a) % HASH_PRIME
+        low = np.outer(hashes & np.uint64(0xFFFF), self._a)
+        permuted = (((high << np.uint64(16)) + low) % HASH_PRIME + self._b) % HASH_PRIME
+        return permuted.min(axis=0)
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denominator = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / denominator) if denominator else 0.0
+
+
+def collapse_clusters(
+    articles: List[Dict[str, Any]],
+    top_k: Optional[int] = None,
+    exclude_clusters: Optional[set] = None
+) -> List[Dict[str, Any]]:
+    """Keep the best-ranked article of each duplicate cluster, in rank order."""
+    seen = set(exclude_clusters or ())
+    collapsed = []
+    for article in articles:
+        cluster_id = article.get("cluster_id") or article.get("id")
+        if cluster_id in seen:
+            continue
+        seen.add(cluster_id)
+        collapsed.append(article)
+        if top_k is not None and len(collapsed) >= top_k:
+            break
+    return collapsed
+
+
+class DuplicateIndex:
+    """Persistent MinHash/LSH index that assigns near-duplicate articles a shared cluster id.
+
+    Each signature is split into ``bands`` bands and every band is hashed into a
+    bucket, so candidate duplicates are found with indexed bucket lookups instead
+    of comparing against every stored article. A candidate is confirmed when its
+    estimated Jaccard similarity reaches ``jaccard_threshold`` (syndicated copies)
+    or the embeddings' cosine similarity reaches ``cosine_threshold``. Rewrites of
+    the same story share few shingles, so articles without any LSH candidate
+    are also checked against their nearest neighbours from ``neighbor_lookup``
+    (the vector store's approximate search) and against earlier articles of the
+    same batch.
+
+    ``assign`` only computes cluster ids; the signatures are written by
+    ``commit`` once the caller knows which articles were stored.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        embedding_lookup: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None,
+        neighbor_lookup: Optional[Callable[[List[float], int], List[Dict[str, Any]]]] = None,
+        hasher: Optional[MinHasher] = None,
+        bands: Optional[int] = None
+    ):
+        self.path = path or config.dedup_path
+        self.embedding_lookup = embedding_lookup
+        self.neighbor_lookup = neighbor_lookup
+        self.neighbors = config.dedup_embedding_neighbors
+        self.neighbor_workers = config.dedup_neighbor_workers
+        self.hasher = hasher or MinHasher()
+        self.bands = bands or config.lsh_bands
+        if self.hasher.num_perm % self.bands:
+            raise ValueError("minhash_num_perm must be a multiple of lsh_bands")
+        self.rows = self.hasher.num_perm // self.bands
+        self.jaccard_threshold = config.dedup_jaccard_threshold
+        self.cosine_threshold = config.dedup_cosine_threshold
+        self.max_candidates = config.dedup_max_candidates
+        self._lock = threading.Lock()
+        # Signatures and buckets of assigned articles, by id, until they are committed
+        self._pending: Dict[str, Tuple[np.ndarray, List[bytes], str]] = {}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                cluster_id TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket BLOB NOT NULL,
+                id TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lsh_buckets_lookup ON lsh_buckets (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lsh_buckets_id ON lsh_buckets (id)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SIGNATURE_VERSION:
+            # Signatures from another hash family never match; the vector store still finds their rewrites
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("DELETE FROM lsh_buckets")
+            self._conn.execute(f"PRAGMA user_version = {SIGNATURE_VERSION}")
+        self._conn.commit()
+
+    def _buckets(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest()
+            for band in range(self.bands)
+        ]
+
+    def _remove_locked(self, article_id: str):
+        self._conn.execute("DELETE FROM signatures WHERE id = ?", (article_id,))
+        self._conn.execute("DELETE FROM lsh_buckets WHERE id = ?", (article_id,))
+
+    def _collisions_locked(self, buckets: List[bytes]) -> Counter:
+        """Count the bands each stored id shares with the signature."""
+        collisions = Counter()
+        for band, bucket in enumerate(buckets):
+            for (candidate,) in self._conn.execute(
+                "SELECT id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+            ):
+                collisions[candidate] += 1
+        return collisions
+
+    def _lsh_match_locked(
+        self,
+        article: Dict[str, Any],
+        signature: np.ndarray,
+        candidates: List[str],
+        batch_signatures: Dict[str, Tuple[np.ndarray, str]],
+        batch_embeddings: Dict[str, Optional[List[float]]]
+    ) -> Optional[str]:
+        """Return the cluster of the first LSH candidate confirmed by Jaccard or cosine similarity."""
+        if not candidates:
+            return None
+        placeholders = ",".join("?" * len(candidates))
+        rows = {
+            row[0]: (np.frombuffer(row[1], dtype=np.uint64), row[2])
+            for row in self._conn.execute(
+                f"SELECT id, signature, cluster_id FROM signatures WHERE id IN ({placeholders})", candidates
+            )
+        }
+        # An article of this batch replaces its stored version
+        rows.update({c: batch_signatures[c] for c in candidates if c in batch_signatures})
+        embeddings: Dict[str, List[float]] = {}
+        if article.get("embedding"):
+            missing = [c for c in candidates if c in rows and not batch_embeddings.get(c)]
+            if missing and self.embedding_lookup is not None:
+                embeddings.update(self.embedding_lookup(missing))
+            embeddings.update({c: batch_embeddings[c] for c in candidates if batch_embeddings.get(c)})
+
+        for candidate in candidates:
+            if candidate not in rows:
+                continue
+            candidate_signature, candidate_cluster = rows[candidate]
+            if estimated_jaccard(signature, candidate_signature) >= self.jaccard_threshold:
+                return candidate_cluster
+            if candidate in embeddings and _cosine(article["embedding"], embeddings[candidate]) >= self.cosine_threshold:
+                return candidate_cluster
+        return None
+
+    def _neighbors(self, articles: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Look up the nearest stored neighbours of each article concurrently, by article id."""
+        if self.neighbor_lookup is None or not self.neighbors or not articles:
+            return {}
+
+        def lookup(article: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return self.neighbor_lookup(article["embedding"], self.neighbors + 1)
+
+        with ThreadPoolExecutor(max_workers=min(self.neighbor_workers, len(articles))) as executor:
+            return dict(zip((article["id"] for article in articles), executor.map(lookup, articles)))
+
+    def _neighbor_match_locked(self, article_id: str, hits: Iterable[Dict[str, Any]]) -> Optional[str]:
+        """Return the cluster of the closest stored embedding above the cosine threshold."""
+        for hit in hits:
+            if hit["id"] == article_id:
+                continue
+            if hit.get("score", 0) < self.cosine_threshold:
+                break
+            if hit.get("cluster_id"):
+                return hit["cluster_id"]
+            row = self._conn.execute("SELECT cluster_id FROM signatures WHERE id = ?", (hit["id"],)).fetchone()
+            return row[0] if row else hit["id"]
+        return None
+
+    def assign(self, articles: List[Dict[str, Any]]) -> int:
+        """Set ``cluster_id`` on each article; return how many joined an existing cluster.
+
+        Nothing is indexed until ``commit`` is called with the articles that were stored.
+        """
+        signatures = [
+            self.hasher.signature(f"{article.get('title', '')} {article.get('content', '')}") for article in articles
+        ]
+        all_buckets = [self._buckets(signature) for signature in signatures]
+        with self._lock:
+            stored_collisions = [self._collisions_locked(buckets) for buckets in all_buckets]
+        for article, collisions in zip(articles, stored_collisions):
+            collisions.pop(article["id"], None)
+        # Only articles sharing no bucket with a stored one are looked up in the vector store
+        neighbors = self._neighbors([
+            article for article, collisions in zip(articles, stored_collisions)
+            if not collisions and article.get("embedding")
+        ])
+
+        batch_embeddings = {article["id"]: article.get("embedding") for article in articles}
+        batch_buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        batch_signatures: Dict[str, Tuple[np.ndarray, str]] = {}
+        batch_clusters: List[str] = []
+        # Normalized embeddings of the batch so far, in the first len(batch_clusters) rows
+        batch_vectors: Optional[np.ndarray] = None
+        duplicates = 0
+        with self._lock:
+            for article, signature, buckets, collisions in zip(articles, signatures, all_buckets, stored_collisions):
+                for band, bucket in enumerate(buckets):
+                    collisions.update(batch_buckets.get((band, bucket), ()))
+                collisions.pop(article["id"], None)
+                candidates = [candidate for candidate, _ in collisions.most_common(self.max_candidates)]
+                cluster_id = self._lsh_match_locked(article, signature, candidates, batch_signatures, batch_embeddings)
+                vector = None
+                if article.get("embedding"):
+                    vector = np.asarray(article["embedding"], dtype=np.float32)
+                    vector /= np.linalg.norm(vector) or 1.0
+                    if batch_vectors is None:
+                        batch_vectors = np.empty((len(articles), len(vector)), dtype=np.float32)
+                    # Rewrites earlier in this batch are not in the vector store yet
+                    if cluster_id is None and batch_clusters:
+                        similarities = batch_vectors[:len(batch_clusters)] @ vector
+                        best = int(np.argmax(similarities))
+                        if similarities[best] >= self.cosine_threshold:
+                            cluster_id = batch_clusters[best]
+                    if cluster_id is None:
+                        cluster_id = self._neighbor_match_locked(article["id"], neighbors.get(article["id"], ()))
+
+                if cluster_id is None:
+                    cluster_id = article["id"]
+                else:
+                    duplicates += 1
+                article["cluster_id"] = cluster_id
+                if vector is not None:
+                    batch_vectors[len(batch_clusters)] = vector
+                    batch_clusters.append(cluster_id)
+                for band, bucket in enumerate(buckets):
+                    batch_buckets.setdefault((band, bucket), []).append(article["id"])
+                batch_signatures[article["id"]] = (signature, cluster_id)
+                self._pending[article["id"]] = (signature, buckets, cluster_id)
+        return duplicates
+
+    def commit(self, articles: List[Dict[str, Any]], stored_ids: Iterable[str]):
+        """Index the assigned articles that were stored and drop the others."""
+        stored_ids = set(stored_ids)
+        with self._lock:
+            for article in articles:
+                pending = self._pending.pop(article["id"], None)
+                if pending is None or article["id"] not in stored_ids:
+                    continue
+                signature, buckets, cluster_id = pending
+                self._remove_locked(article["id"])
+                self._conn.execute(
+                    "INSERT INTO signatures (id, signature, cluster_id) VALUES (?, ?, ?)",
+                    (article["id"], signature.tobytes(), cluster_id)
+                )
+                self._conn.executemany(
+                    "INSERT INTO lsh_buckets (band, bucket, id) VALUES (?, ?, ?)",
+                    [(band, bucket, article["id"]) for band, bucket in enumerate(buckets)]
+                )
+            self._conn.commit()
+
+    def forget(self, article_id: str):
+        """Drop an article from the index."""
+        with self._lock:
+            self._remove_locked(article_id)
+            self._conn.commit()
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from config import config
+
+
+def content_hash(text: str) -> str:
+    """Return the sha256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model, input_type, sha256 of text).
+
+    Embeddings are stored as float32 BLOBs in SQLite. Every hit refreshes the
+    entry's ``last_used`` timestamp and the least recently used entries are
+    evicted once the cache grows past ``max_entries``. Hits are recorded in
+    memory and written in one transaction every ``embedding_cache_touch_batch``
+    hits, before an eviction, or on ``flush``, so a lookup does not commit.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or config.embedding_cache_path
+        self.max_entries = max_entries or config.embedding_cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[Tuple[str, str, str], float] = {}  # last_used of hits not yet written
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                input_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, input_type, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, input_type: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts, returning None for every miss."""
+        hashes = [content_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND input_type = ? AND text_hash IN ({placeholders})",
+                    [model, input_type, *chunk]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._touched.update(((model, input_type, text_hash), now) for text_hash in found)
+                if len(self._touched) >= config.embedding_cache_touch_batch:
+                    self._flush_locked()
+
+            results = []
+            for text_hash in hashes:
+                blob = found.get(text_hash)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+            return results
+
+    def put_many(self, model: str, input_type: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts and evict the least recently used overflow."""
+        now = time.time()
+        rows = [
+            (model, input_type, content_hash(text), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            # Evict by up-to-date timestamps
+            self._flush_locked(commit=False)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, input_type, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def _flush_locked(self, commit: bool = True):
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND input_type = ? AND text_hash = ?",
+            [(last_used, *key) for key, last_used in self._touched.items()]
+        )
+        self._touched.clear()
+        if commit:
+            self._conn.commit()
+
+    def flush(self):
+        """Write the ``last_used`` timestamps of recent hits."""
+        with self._lock:
+            self._flush_locked()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of cached entries."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": size
+        }
@@ -1,50 +1,139 @@
-import cohere
-from typing import List, Dict, Any, Optional
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from config import config
+from clients import cohere_client
+from embedding_cache import EmbeddingCache
+from rate_limit import TokenBucket
+from metrics import embedding_batch_seconds, embedding_texts_total
+
+if TYPE_CHECKING:
+    import cohere
 
 class EmbeddingGenerator:
-    def __init__(self, cohere_client: Optional[cohere.Client] = None):
-        self.client = cohere_client or cohere.Client(config.cohere_api_key)
+    def __init__(
+        self,
+        cohere_client: Optional["cohere.Client"] = None,
+        cache: Optional[EmbeddingCache] = None,
+        rate_limiter: Optional[TokenBucket] = None
+    ):
+        self._client = cohere_client
+        if cache is None and config.embedding_cache_enabled:
+            cache = EmbeddingCache()
+        self.cache = cache
+        self.rate_limiter = rate_limiter or TokenBucket.per_minute(config.embedding_requests_per_minute)
+        self.batch_size = config.embedding_batch_size
+        self.max_concurrency = config.embedding_max_concurrency
+        self.max_retries = config.embedding_max_retries
+        self.retry_backoff = config.embedding_retry_backoff
+
+    @property
+    def client(self) -> "cohere.Client":
+        """The Cohere client, defaulting to the shared one on first use."""
+        if self._client is None:
+            self._client = cohere_client()
+        return self._client
+
+    @client.setter
+    def client(self, client: "cohere.Client"):
+        self._client = client
+
+    def _embed_batch(self, texts: List[str], input_type: str) -> Optional[List[List[float]]]:
+        """Embed one provider-sized batch, retrying with exponential backoff."""
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            try:
+                self.rate_limiter.acquire()
+                start = time.perf_counter()
+                response = self.client.embed(
+                    texts=texts,
+                    model=config.embedding_model,
+                    input_type=input_type
+                )
+                embedding_batch_seconds.observe(time.perf_counter() - start, input_type=input_type, outcome="success")
+                embedding_texts_total.inc(len(texts), input_type=input_type)
+                return response.embeddings
+            except Exception as e:
+                embedding_batch_seconds.observe(time.perf_counter() - start, input_type=input_type, outcome="error")
+                print(f"Error embedding batch of {len(texts)} (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_backoff * 2 ** attempt + random.uniform(0, self.retry_backoff))
+        return None
+
+    def _embed_uncached(self, texts: List[str], input_type: str) -> List[Optional[List[float]]]:
+        """Embed texts in concurrent batches; texts in a batch that keeps failing get None."""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0], input_type)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                results = list(executor.map(lambda batch: self._embed_batch(batch, input_type), batches))
+
+        embeddings = []
+        for batch, result in zip(batches, results):
+            embeddings.extend(result if result is not None else [None] * len(batch))
+        return embeddings
+
+    def _embed(self, texts: List[str], input_type: str) -> List[Optional[List[float]]]:
+        """Embed texts, serving cache hits locally and sending only misses to Cohere."""
+        if self.cache is None:
+            return self._embed_uncached(texts, input_type)
 
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts using Cohere."""
+        embeddings = self.cache.get_many(config.embedding_model, input_type, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing], input_type)
+            stored = [(texts[i], embedding) for i, embedding in zip(missing, fresh) if embedding is not None]
+            if stored:
+                self.cache.put_many(
+                    config.embedding_model,
+                    input_type,
+                    [text for text, _ in stored],
+                    [embedding for _, embedding in stored]
+                )
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        return embeddings
+
+    def generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Generate embeddings for a list of texts using Cohere.
+
+        The result is aligned with ``texts``; entries whose batch failed every retry are None.
+        """
         try:
-            response = self.client.embed(
-                texts=texts,
-                model="embed-english-v3.0",
-                input_type="search_document"
-            )
-            return response.embeddings
+            return self._embed(texts, "search_document")
         except Exception as e:
             print(f"Error generating embeddings: {str(e)}")
-            return []
+            return [None] * len(texts)
 
     def process_articles(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Process articles and add embeddings to them."""
         # Prepare texts for embedding
         texts = [
-            f"{article['title']} {article['content']}" 
+            f"{article['title']} {article['content']}"
             for article in articles
         ]
-        
+
         # Generate embeddings
         embeddings = self.generate_embeddings(texts)
-        
-        # Add embeddings to articles
+
+        # Add embeddings to articles, leaving failed ones without an embedding
+        failed = 0
         for article, embedding in zip(articles, embeddings):
+            if embedding is None:
+                failed += 1
+                continue
             article["embedding"] = embedding
-        
+        if failed:
+            print(f"Failed to embed {failed} of {len(articles)} articles")
+
         return articles
 
     def get_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for a search query."""
         try:
-            response = self.client.embed(
-                texts=[query],
-                model="embed-english-v3.0",
-                input_type="search_query"
-            )
-            return response.embeddings[0]
+            return self._embed([query], "search_query")[0] or []
         except Exception as e:
             print(f"Error generating query embedding: {str(e)}")
             return []
@@ -0,0 +1,175 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+
+from config import config
+
+# Text inside these elements is never part of BeautifulSoup's get_text() output
+SKIPPED_ELEMENTS = frozenset(["script", "style", "template", "rt", "rp"])
+
+
+class _TextExtractor(HTMLParser):
+    """Single-pass tokenizer that collects the text BeautifulSoup's get_text() would return."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts: List[str] = []
+        self._open_tags: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._open_tags.append(tag)
+        if tag in SKIPPED_ELEMENTS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        # Like BeautifulSoup, an end tag closes everything opened after its start tag
+        # and is ignored when no such tag is open
+        if tag not in self._open_tags:
+            return
+        while self._open_tags:
+            closed = self._open_tags.pop()
+            if closed in SKIPPED_ELEMENTS:
+                self._skip_depth -= 1
+            if closed == tag:
+                break
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def handle_charref(self, name):
+        # Mirrors BeautifulSoup's handling, including the Windows-1252 fallback for &#128;-&#159;
+        if name.startswith("x"):
+            code = int(name.lstrip("x"), 16)
+        elif name.startswith("X"):
+            code = int(name.lstrip("X"), 16)
+        else:
+            code = int(name)
+
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections even inside skipped elements
+        if data.upper().startswith("CDATA["):
+            self.parts.append(data[len("CDATA["):])
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse every run of whitespace to a single space and strip the ends."""
+    return " ".join(text.split())
+
+
+def clean_html_reference(html_content: str) -> str:
+    """Original BeautifulSoup-based cleaner, kept as the reference for clean_html."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Get text content
+    text = soup.get_text()
+
+    # Clean up whitespace
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = ' '.join(chunk for chunk in chunks if chunk)
+
+    # Remove extra spaces
+    text = re.sub(r'\s+', ' ', text)
+
+    return text.strip()
+
+
+def clean_html_uncached(html_content: str) -> str:
+    """Extract plain text from HTML in one streaming pass, skipping script and style."""
+    if "<" not in html_content and "&" not in html_content:
+        return normalize_whitespace(html_content)
+    parser = _TextExtractor()
+    parser.feed(html_content)
+    parser.close()
+    return normalize_whitespace("".join(parser.parts))
+
+
+class _CleanCache:
+    """LRU of cleaned text keyed by a digest of the raw HTML."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: bytes, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = _CleanCache(config.html_clean_cache_size)
+
+
+def _content_key(html_content: str) -> bytes:
+    return hashlib.blake2b(html_content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def clean_html(html_content: str) -> str:
+    """Clean HTML content and extract plain text, reusing results for identical input."""
+    key = _content_key(html_content)
+    cleaned = _cache.get(key)
+    if cleaned is None:
+        cleaned = clean_html_uncached(html_content)
+        _cache.set(key, cleaned)
+    return cleaned
+
+
+def clean_html_many(contents: List[str], workers: Optional[int] = None) -> List[str]:
+    """Clean many HTML documents, spreading large batches of cache misses over a process pool."""
+    workers = config.html_clean_workers if workers is None else workers
+    if workers <= 1 or len(contents) < config.html_clean_parallel_threshold:
+        return [clean_html(content) for content in contents]
+
+    keys = [_content_key(content) for content in contents]
+    results = [_cache.get(key) for key in keys]
+    missing = [i for i, cleaned in enumerate(results) if cleaned is None]
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            cleaned = executor.map(clean_html_uncached, [contents[i] for i in missing], chunksize=64)
+            for i, text in zip(missing, cleaned):
+                _cache.set(keys[i], text)
+                results[i] = text
+    return results
@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Optional
+
+from config import config
+
+logger = logging.getLogger('JobScheduler')
+
+
+@dataclass
+class IngestJob:
+    id: str
+    trigger: str
+    status: str = "queued"  # queued, running, succeeded, partial or failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: Dict[str, float] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        if self.started_at is not None:
+            data["duration"] = (self.finished_at or time.time()) - self.started_at
+        return data
+
+
+class JobScheduler:
+    """Single-writer queue that runs ingest jobs one at a time on a background thread.
+
+    Overlapping triggers are de-duplicated: while a job is still queued, further
+    triggers return that job instead of queueing another run. A periodic timer
+    can trigger ingest every ``interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[], Dict[str, Any]],
+        interval: Optional[float] = None,
+        history_size: Optional[int] = None
+    ):
+        self.process = process
+        self.interval = config.ingest_interval_seconds if interval is None else interval
+        self.history_size = history_size or config.job_history_size
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: "queue.Queue[Optional[IngestJob]]" = queue.Queue()
+        self._pending: Optional[IngestJob] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._timer: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the worker thread, and the periodic timer if an interval is configured."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run_worker, name="ingest-worker", daemon=True)
+                self._worker.start()
+            if self.interval and self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name="ingest-timer", daemon=True)
+                self._timer.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop accepting periodic triggers and let the worker exit after its current job."""
+        self._stop.set()
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def trigger(self, source: str = "manual") -> IngestJob:
+        """Queue an ingest run, or return the already queued one."""
+        self.start()
+        with self._lock:
+            if self._pending is not None:
+                logger.info("Ingest already queued as job %s, ignoring %s trigger", self._pending.id, source)
+                return self._pending
+            job = IngestJob(id=uuid.uuid4().hex, trigger=source)
+            self._pending = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history_size:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        logger.info("Queued ingest job %s (%s)", job.id, source)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Return a job by id, or None if it is unknown or has aged out of the history."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run_worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if self._pending is job:
+                    self._pending = None
+                job.status = "running"
+                job.started_at = time.time()
+
+            logger.info("Running ingest job %s", job.id)
+            try:
+                result = self.process()
+                job.result = {key: value for key, value in result.items() if key != "timings"}
+                job.stages = result.get("timings", {})
+                # A partial run stored some articles and retries the rest on the next run
+                job.status = {"success": "succeeded", "partial": "partial"}.get(result.get("status"), "failed")
+                if job.status == "failed":
+                    job.error = result.get("message")
+            except Exception as e:
+                logger.exception("Ingest job %s failed", job.id)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+            logger.info("Ingest job %s finished with status %s", job.id, job.status)
+
+    def _run_timer(self):
+        while not self._stop.wait(self.interval):
+            self.trigger("schedule")
@@ -0,0 +1,126 @@
+"""Helpers of the versioned JSON API: cursors, field projection, compression and revalidation.
+
+Responses carry a weak ETag built from the article store's version, which
+changes on every write by any process, and for ranked results from the
+generations of the vector and lexical indexes. These are persisted, so every
+worker and a restarted server give the same ETag for the same data. It is
+known before any work is done: a client revalidating an unchanged result gets
+a 304 without a search.
+"""
+import base64
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Request, Response
+
+from config import config
+
+API_FIELDS = ("id", "title", "content", "link", "published", "source", "categories", "cluster_id", "score")
+DEFAULT_FIELDS = ("id", "title", "link", "published", "source", "categories", "cluster_id", "score")
+
+# Results also depend on the models and indexes searched, so a configuration change invalidates every ETag
+_CONFIG_DIGEST = hashlib.sha256(json.dumps([
+    config.embedding_model,
+    config.vector_backend,
+    config.pinecone_index_name if config.vector_backend == "pinecone" else config.local_index_dir,
+    config.lexical_index_path,
+    config.dedup_enabled
+]).encode("utf-8")).hexdigest()[:8]
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Return the fields asked for with ``?fields=``, the defaults without content if none."""
+    if not fields:
+        return DEFAULT_FIELDS
+    requested = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in API_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(API_FIELDS)}"
+        )
+    return requested
+
+
+def project(articles: Iterable[Dict[str, Any]], fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Keep only the requested fields of each article; embeddings are never among them."""
+    return [{name: article[name] for name in fields if name in article} for article in articles]
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], key: str) -> Optional[int]:
+    """Return the position stored under ``key`` in a cursor, or None without a cursor."""
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))[key]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(position, int) or position < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return position
+
+
+def make_etag(version: Iterable[Any]) -> str:
+    """Return a weak ETag for a data version; the URL, and so the query, is part of the cache key already."""
+    return 'W/"v1-{}-{}"'.format(_CONFIG_DIGEST, "-".join(str(part) for part in version))
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={config.api_cache_max_age}, must-revalidate",
+        "Vary": "Accept-Encoding"
+    }
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client already holds the representation with this ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    # Weak comparison, as required for If-None-Match
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Return whether an Accept-Encoding header allows gzip, honouring q-values and ``*``."""
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    # An explicit gzip or x-gzip entry takes precedence over the wildcard
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def json_response(request: Request, payload: Any, etag: str) -> Response:
+    """Serialize a payload with orjson, gzip it when the client accepts it and it is large enough."""
+    body = orjson.dumps(payload)
+    headers = _cache_headers(etag)
+    if len(body) >= config.api_gzip_min_size and accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = gzip.compress(body, compresslevel=config.api_gzip_level)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
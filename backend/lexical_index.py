@@ -0,0 +1,222 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import config
+from search_filters import SearchFilter, parse_published
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the their this to was were will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: Optional[int] = None) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank) per id, best first."""
+    k = k or config.rrf_k
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over article title, content and categories.
+
+    Title tokens are counted ``title_weight`` times so matches in the title rank
+    higher. Per-document term frequencies and filterable fields are persisted
+    to ``path`` and the posting lists are rebuilt from them on load. Changes
+    are appended to a log next to it, one JSON line per document, which is
+    folded into ``path`` once it outgrows ``lexical_index_compact_ratio`` of
+    the index.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: Optional[float] = None, b: Optional[float] = None):
+        self.path = path or config.lexical_index_path
+        self.log_path = f"{os.path.splitext(self.path)[0]}.log"
+        # Compare with None: b = 0 turns off length normalization
+        self.k1 = k1 if k1 is not None else config.bm25_k1
+        self.b = b if b is not None else config.bm25_b
+        self._lock = threading.RLock()
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._doc_fields: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self.generation = 0  # Bumped on every change to the index and persisted, used to version responses
+        self._log_entries = 0  # Lines in the log since the last save
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if isinstance(stored.get("generation"), int) and isinstance(stored.get("documents"), dict):
+                self.generation = stored["generation"]
+                stored = stored["documents"]
+            for doc_id, doc in stored.items():
+                if "terms" not in doc:
+                    # Indexes written before filter support hold the term counts only
+                    doc = {"terms": doc, "fields": {}}
+                self._add_locked(doc_id, doc["terms"], doc["fields"])
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line torn by a crash: save without it, so later appends are not lost behind it
+                        self.save()
+                        return
+                    if entry.get("removed"):
+                        self._remove_locked(entry["id"])
+                    else:
+                        self._add_locked(entry["id"], entry["terms"], entry["fields"])
+                    self._log_entries += 1
+                    self.generation += 1
+
+    def _append_locked(self, entries: List[Dict[str, Any]]):
+        """Append changes to the log, or save the whole index once the log has grown."""
+        self._log_entries += len(entries)
+        threshold = max(config.lexical_index_compact_min_entries, config.lexical_index_compact_ratio * len(self))
+        if self._log_entries > threshold:
+            self.save()
+            return
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in entries)
+
+    def save(self):
+        """Persist per-document term frequencies atomically and empty the log."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "generation": self.generation,
+                        "documents": {
+                            doc_id: {"terms": terms, "fields": self._doc_fields[doc_id]}
+                            for doc_id, terms in self._doc_terms.items()
+                        }
+                    },
+                    f,
+                    ensure_ascii=False,
+                    separators=(",", ":")
+                )
+            os.replace(tmp_path, self.path)
+            # Replaying the log over the new file is harmless, so a crash before this loses nothing
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self._log_entries = 0
+
+    @staticmethod
+    def article_terms(article: Dict[str, Any]) -> Dict[str, int]:
+        """Count the index terms of an article, weighting the title."""
+        counts = Counter(tokenize(article.get("content", "")))
+        counts.update(tokenize(" ".join(article.get("categories", []))))
+        for _ in range(config.bm25_title_weight):
+            counts.update(tokenize(article.get("title", "")))
+        return dict(counts)
+
+    @staticmethod
+    def article_fields(article: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the metadata used to filter an article at query time."""
+        published_ts = article.get("published_ts")
+        if published_ts is None:
+            published_ts = parse_published(article.get("published"))
+        return {
+            "source": article.get("source"),
+            "categories": list(article.get("categories", [])),
+            "published_ts": published_ts
+        }
+
+    def _remove_locked(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        self._doc_fields.pop(doc_id, None)
+
+    def _add_locked(self, doc_id: str, terms: Dict[str, int], fields: Dict[str, Any]):
+        self._remove_locked(doc_id)
+        self._doc_terms[doc_id] = terms
+        self._doc_fields[doc_id] = fields
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings[term][doc_id] = frequency
+
+    def add_articles(self, articles: List[Dict[str, Any]], persist: bool = True):
+        """Index or re-index articles by id."""
+        entries = [
+            {"id": article["id"], "terms": self.article_terms(article), "fields": self.article_fields(article)}
+            for article in articles
+        ]
+        with self._lock:
+            for entry in entries:
+                self._add_locked(entry["id"], entry["terms"], entry["fields"])
+            # One step per log entry, so a reload from the file and the log gives the same generation
+            self.generation += len(entries)
+            if persist:
+                self._append_locked(entries)
+
+    def remove_article(self, article_id: str, persist: bool = True):
+        """Drop an article from the index."""
+        with self._lock:
+            self._remove_locked(article_id)
+            self.generation += 1
+            if persist:
+                self._append_locked([{"id": article_id, "removed": True}])
+
+    def search(
+        self,
+        query: str,
+        top_k: int = None,
+        filters: Optional[SearchFilter] = None
+    ) -> List[Tuple[str, float]]:
+        """Return (article id, BM25 score) pairs for the best matching articles."""
+        top_k = top_k or config.top_k_results
+        query_terms = set(tokenize(query))
+        if filters is not None and filters.is_empty():
+            filters = None
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs or not query_terms:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = defaultdict(float)
+            rejected = set()
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if filters is not None and (doc_id in rejected or (
+                        doc_id not in scores and not filters.matches(self._doc_fields[doc_id])
+                    )):
+                        rejected.add(doc_id)
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from config import config
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Build a stable cache key from keyword parts such as model, template version and prompt hash."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier TTL cache for LLM completions with single-flight de-duplication.
+
+    The memory tier is an LRU bounded by ``max_entries``. The optional disk tier
+    is a SQLite table that survives restarts. Concurrent ``get_or_compute`` calls
+    for the same key share one upstream call instead of each making their own.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        path: Optional[str] = None,
+        use_disk: Optional[bool] = None
+    ):
+        self.ttl = ttl if ttl is not None else config.llm_cache_ttl
+        self.max_entries = max_entries or config.llm_cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        use_disk = config.llm_cache_disk if use_disk is None else use_disk
+        self._conn = None
+        if use_disk:
+            path = path or config.llm_cache_path
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def _get_locked(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                return value
+            del self._memory[key]
+
+        if self._conn is not None:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                if row[1] > now:
+                    value = json.loads(row[0])
+                    self._set_memory_locked(key, value, row[1])
+                    return value
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+        return None
+
+    def _set_memory_locked(self, key: str, value: Any, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, record_stats: bool = False) -> Optional[Any]:
+        """Return the cached value for a key, or None if it is missing or expired.
+
+        With ``record_stats`` the lookup counts as a hit or miss, for callers
+        that fill the cache themselves instead of using ``get_or_compute``.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if record_stats:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """Cache a JSON-serializable value for ``ttl`` seconds."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._set_memory_locked(key, value, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+                self._conn.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value or compute it once, sharing the result with concurrent callers.
+
+        Exceptions raised by ``compute`` are propagated to every waiting caller and nothing is cached.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of entries held in memory."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
@@ -0,0 +1,455 @@
+import json
+import os
+import threading
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from config import config
+from search_filters import SearchFilter, parse_published
+from metrics import vector_upsert_seconds, vector_query_seconds
+from vector_store import UpsertResult
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.npy"
+DELTA_PREFIX = "delta_"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so a dot product equals cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _atomic_save_npy(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _atomic_save_json(path: str, payload: Any):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class _Rows:
+    """A NumPy array that grows in place along its first axis, doubling its capacity when full.
+
+    A read-only array, such as a memory-mapped file, is copied into memory on
+    the first write.
+    """
+
+    def __init__(self, array: np.ndarray):
+        self._data = array
+        self.size = len(array)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    def _reserve(self, size: int):
+        if size <= len(self._data) and self._data.flags.writeable:
+            return
+        data = np.empty((max(size, 2 * len(self._data), 64),) + self._data.shape[1:], dtype=self._data.dtype)
+        data[:self.size] = self._data[:self.size]
+        self._data = data
+
+    def extend(self, rows: np.ndarray):
+        self._reserve(self.size + len(rows))
+        self._data[self.size:self.size + len(rows)] = rows
+        self.size += len(rows)
+
+    def assign(self, indices: np.ndarray, rows: np.ndarray):
+        self._reserve(self.size)
+        self._data[indices] = rows
+
+
+class LocalVectorStore:
+    """In-process vector index with the same API as the Pinecone VectorStore.
+
+    Vectors are kept as a normalized float32 matrix for exact cosine search.
+    Once the corpus reaches ``ivf_min_vectors`` an IVF (inverted file) index
+    is trained so queries only scan the ``n_probe`` closest clusters. Filtered
+    queries are pre-filtered with per-source and per-category posting lists and
+    a timestamp column, then scanned exactly. The index is persisted to
+    ``index_dir`` and memory-mapped on startup.
+
+    Upserts grow the matrix in place and are persisted as small delta files,
+    so their cost depends on the batch rather than the corpus. The deltas are
+    folded into a full snapshot once they hold more than
+    ``local_index_compact_ratio`` of the snapshot's rows.
+    """
+
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        dimension: Optional[int] = None,
+        ivf_min_vectors: Optional[int] = None,
+        n_probe: Optional[int] = None
+    ):
+        self.index_dir = index_dir or config.local_index_dir
+        self.dimension = dimension or config.vector_dimension
+        self.ivf_min_vectors = ivf_min_vectors or config.ivf_min_vectors
+        self.n_probe = n_probe or config.ivf_n_probe
+        self._lock = threading.RLock()
+        self.generation = 0  # Bumped on every change to the index, used to invalidate cached results
+
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._vectors = _Rows(np.empty((0, self.dimension), dtype=np.float32))
+        self._timestamps = _Rows(np.empty(0, dtype=np.float64))
+        self._centroids: Optional[np.ndarray] = None
+        self._assignment_rows: Optional[_Rows] = None
+        self._trained_size = 0
+        self._source_rows: Dict[str, List[int]] = {}
+        self._category_rows: Dict[str, List[int]] = {}
+        self._delta_seq = 0  # Sequence number of the last delta file written
+        self._saved_rows = 0  # Rows in the last full snapshot
+        self._delta_rows = 0  # Rows upserted since then
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def _matrix(self) -> np.ndarray:
+        return self._vectors.array
+
+    @property
+    def _published_ts(self) -> np.ndarray:
+        return self._timestamps.array
+
+    @property
+    def _assignments(self) -> Optional[np.ndarray]:
+        return self._assignment_rows.array if self._assignment_rows is not None else None
+
+    @_assignments.setter
+    def _assignments(self, assignments: Optional[np.ndarray]):
+        self._assignment_rows = _Rows(assignments) if assignments is not None else None
+
+    def warmup(self):
+        """Nothing to resolve: the index is loaded on construction."""
+
+    def version(self) -> int:
+        """Return the generation of the index this process serves, restored from disk on load."""
+        return self.generation
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.index_dir, filename)
+
+    def _delta_files(self) -> List[int]:
+        """Return the sequence numbers of the complete delta files, oldest first."""
+        sequences = []
+        for name in os.listdir(self.index_dir):
+            # The metadata file is written last, so it marks a complete delta
+            if name.startswith(DELTA_PREFIX) and name.endswith(".json"):
+                sequences.append(int(name[len(DELTA_PREFIX):-len(".json")]))
+        return sorted(sequences)
+
+    def _load(self):
+        """Load the persisted snapshot, memory-mapping the embedding matrix, then replay newer deltas."""
+        metadata_path = self._path(METADATA_FILE)
+        embeddings_path = self._path(EMBEDDINGS_FILE)
+        if os.path.exists(metadata_path) and os.path.exists(embeddings_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            self._ids = stored["ids"]
+            self._metadata = stored["metadata"]
+            self._id_to_row = {article_id: row for row, article_id in enumerate(self._ids)}
+            self._vectors = _Rows(np.load(embeddings_path, mmap_mode="r"))
+            self._trained_size = stored.get("ivf_trained_size", 0)
+            self._delta_seq = stored.get("delta_seq", 0)
+            self._saved_rows = len(self._ids)
+
+            centroids_path = self._path(CENTROIDS_FILE)
+            assignments_path = self._path(ASSIGNMENTS_FILE)
+            if self._trained_size and os.path.exists(centroids_path) and os.path.exists(assignments_path):
+                self._centroids = np.load(centroids_path)
+                self._assignments = np.load(assignments_path)
+            self._rebuild_filter_index()
+
+        for sequence in self._delta_files():
+            if sequence <= self._delta_seq:
+                continue  # Already part of the snapshot
+            name = f"{DELTA_PREFIX}{sequence:08d}"
+            with open(self._path(f"{name}.json"), "r", encoding="utf-8") as f:
+                delta = json.load(f)
+            self._apply(delta["ids"], delta["metadata"], np.load(self._path(f"{name}.npy")))
+            self._delta_seq = sequence
+            self._delta_rows += len(delta["ids"])
+        # Every change advances the delta sequence, so processes that load the same files agree
+        self.generation = self._delta_seq
+
+    @staticmethod
+    def _timestamp(metadata: Dict[str, Any]) -> float:
+        timestamp = metadata.get("published_ts")
+        if timestamp is None:
+            timestamp = parse_published(metadata.get("published"))
+        return np.nan if timestamp is None else timestamp
+
+    def _index_filters(self, start: int):
+        """Add the rows from ``start`` on to the posting lists and the timestamp column."""
+        self._timestamps.extend(np.array(
+            [self._timestamp(metadata) for metadata in self._metadata[start:]], dtype=np.float64
+        ))
+        for row in range(start, len(self._metadata)):
+            metadata = self._metadata[row]
+            self._source_rows.setdefault(metadata.get("source"), []).append(row)
+            for category in metadata.get("categories") or []:
+                self._category_rows.setdefault(category, []).append(row)
+
+    def _rebuild_filter_index(self):
+        """Rebuild the per-source and per-category posting lists and the timestamp column."""
+        self._timestamps = _Rows(np.empty(0, dtype=np.float64))
+        self._source_rows = {}
+        self._category_rows = {}
+        self._index_filters(0)
+
+    def _filter_mask(self, filters: SearchFilter) -> np.ndarray:
+        """Return a boolean row mask for the filter, built from the posting lists."""
+        mask = np.ones(len(self._ids), dtype=bool)
+        if filters.source is not None:
+            source_mask = np.zeros(len(self._ids), dtype=bool)
+            source_mask[self._source_rows.get(filters.source, [])] = True
+            mask &= source_mask
+        if filters.category is not None:
+            category_mask = np.zeros(len(self._ids), dtype=bool)
+            category_mask[self._category_rows.get(filters.category, [])] = True
+            mask &= category_mask
+        # Comparisons with NaN are False, so articles without a date never match a date range
+        if filters.published_after is not None:
+            mask &= self._published_ts >= filters.published_after
+        if filters.published_before is not None:
+            mask &= self._published_ts <= filters.published_before
+        return mask
+
+    def _save(self):
+        """Write a full snapshot atomically, so a crash never leaves a torn file, and drop the deltas it covers."""
+        _atomic_save_npy(self._path(EMBEDDINGS_FILE), np.ascontiguousarray(self._matrix))
+        if self._centroids is not None:
+            _atomic_save_npy(self._path(CENTROIDS_FILE), self._centroids)
+            _atomic_save_npy(self._path(ASSIGNMENTS_FILE), self._assignments)
+        # The snapshot names the last delta it includes, so deltas left by a crash here are skipped on load
+        _atomic_save_json(self._path(METADATA_FILE), {
+            "ids": self._ids,
+            "metadata": self._metadata,
+            "ivf_trained_size": self._trained_size,
+            "delta_seq": self._delta_seq
+        })
+        for sequence in self._delta_files():
+            if sequence <= self._delta_seq:
+                name = f"{DELTA_PREFIX}{sequence:08d}"
+                for extension in (".json", ".npy"):
+                    if os.path.exists(self._path(name + extension)):
+                        os.remove(self._path(name + extension))
+        self._saved_rows = len(self._ids)
+        self._delta_rows = 0
+
+    def _persist(self, ids: List[str], metadata: List[Dict[str, Any]], vectors: np.ndarray):
+        """Persist an applied upsert as a delta file, or as a new snapshot once the deltas have grown."""
+        self._delta_seq += 1
+        self._delta_rows += len(ids)
+        threshold = max(config.local_index_compact_min_rows, config.local_index_compact_ratio * self._saved_rows)
+        if self._delta_rows > threshold:
+            self._save()
+            return
+        name = f"{DELTA_PREFIX}{self._delta_seq:08d}"
+        _atomic_save_npy(self._path(f"{name}.npy"), vectors)
+        _atomic_save_json(self._path(f"{name}.json"), {"ids": ids, "metadata": metadata})
+
+    def _train_ivf(self, iterations: int = 10):
+        """Cluster the matrix with k-means to build the IVF coarse quantizer."""
+        n = len(self._ids)
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        centroids = self._matrix[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(self._matrix @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = self._matrix[assignments == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self._centroids = centroids
+        self._assignments = np.argmax(self._matrix @ centroids.T, axis=1).astype(np.int32)
+        self._trained_size = n
+
+    def _update_ivf(self, changed_rows: Sequence[int] = ()):
+        """Train the IVF index when the corpus is large enough, retrain when it has doubled.
+
+        Otherwise only the changed rows and the rows added since the last call
+        are assigned to their closest cluster.
+        """
+        n = len(self._ids)
+        if n < self.ivf_min_vectors:
+            self._centroids = None
+            self._assignments = None
+            self._trained_size = 0
+            return
+        if self._centroids is None or self._assignment_rows is None or n >= 2 * self._trained_size:
+            self._train_ivf()
+            return
+        changed_rows = np.asarray(changed_rows, dtype=np.int64)
+        if len(changed_rows):
+            self._assignment_rows.assign(
+                changed_rows, np.argmax(self._matrix[changed_rows] @ self._centroids.T, axis=1)
+            )
+        start = self._assignment_rows.size
+        if start < n:
+            self._assignment_rows.extend(
+                np.argmax(self._matrix[start:] @ self._centroids.T, axis=1).astype(np.int32)
+            )
+
+    def _apply(self, ids: List[str], metadata: List[Dict[str, Any]], vectors: np.ndarray):
+        """Write a batch of distinct ids into the in-memory index."""
+        rows = [self._id_to_row.get(article_id) for article_id in ids]
+        updated = [i for i, row in enumerate(rows) if row is not None]
+        added = [i for i, row in enumerate(rows) if row is None]
+        updated_rows = [rows[i] for i in updated]
+        # Grow the arrays before the lists, so ids and matrix rows line up even if that fails
+        if updated:
+            self._vectors.assign(np.asarray(updated_rows, dtype=np.int64), vectors[updated])
+        if added:
+            self._vectors.extend(vectors[added])
+        start = len(self._ids)
+        for i, row in zip(updated, updated_rows):
+            self._metadata[row] = metadata[i]
+        for i in added:
+            self._id_to_row[ids[i]] = len(self._ids)
+            self._ids.append(ids[i])
+            self._metadata.append(metadata[i])
+
+        self._update_ivf(updated_rows)
+        if updated:
+            # A changed source or category moves rows between posting lists
+            self._rebuild_filter_index()
+        else:
+            self._index_filters(start)
+
+    def upsert_articles(self, articles: List[Dict[str, Any]]) -> UpsertResult:
+        """Upsert articles to the vector store."""
+        ids = list(dict.fromkeys(article["id"] for article in articles if "embedding" in article))
+        try:
+            # Build the whole batch first, so a bad article leaves the index untouched.
+            # A repeated id keeps its last version.
+            batch: Dict[str, Any] = {}
+            for article in articles:
+                if "embedding" not in article:
+                    continue
+                vector = _normalize(np.asarray(article["embedding"], dtype=np.float32))
+                if vector.shape != (self.dimension,):
+                    raise ValueError(f"Embedding of {article['id']} has shape {vector.shape}, expected ({self.dimension},)")
+                metadata = {
+                    "title": article["title"],
+                    "content": article["content"],
+                    "link": article["link"],
+                    "published": article["published"],
+                    "source": article["source"],
+                    "categories": article["categories"]
+                }
+                for key in ("published_ts", "cluster_id"):
+                    if article.get(key) is not None:
+                        metadata[key] = article[key]
+                batch[article["id"]] = (vector, metadata)
+            if not batch:
+                return UpsertResult(upserted_ids=ids)
+            vectors = np.stack([vector for vector, _ in batch.values()])
+            metadata = [entry for _, entry in batch.values()]
+
+            with self._lock, vector_upsert_seconds.time(backend="local"):
+                self._apply(ids, metadata, vectors)
+                self.generation += 1
+                self._persist(ids, metadata, vectors)
+            return UpsertResult(upserted_ids=ids)
+        except Exception as e:
+            print(f"Error upserting articles: {str(e)}")
+            return UpsertResult(failed_ids=ids)
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Return the rows in the closest IVF clusters, or None for an exact scan."""
+        if self._centroids is None:
+            return None
+        n_probe = min(self.n_probe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+        return np.flatnonzero(np.isin(self._assignments, probes))
+
+    def search_similar(
+        self,
+        query_embedding: List[float],
+        top_k: int = None,
+        filters: Optional[SearchFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for similar articles using the query embedding, optionally restricted by metadata."""
+        try:
+            top_k = top_k or config.top_k_results
+            query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+            with vector_query_seconds.time(backend="local"):
+                with self._lock:
+                    if not self._ids:
+                        return []
+                    if filters is not None and not filters.is_empty():
+                        # Pre-filter, then scan only the matching rows exactly
+                        rows = np.flatnonzero(self._filter_mask(filters))
+                        if not len(rows):
+                            return []
+                    else:
+                        rows = self._candidate_rows(query)
+                    # Scored without the lock: upserts add rows past this prefix or reallocate, and deletes
+                    # replace the arrays and lists rather than shifting them. Only the vector of an article
+                    # updated meanwhile is rewritten in place, which can skew its score for this query.
+                    matrix, ids, metadata = self._matrix, self._ids, self._metadata
+
+                if rows is None:
+                    scores = matrix @ query
+                    rows = np.arange(len(scores))
+                else:
+                    scores = matrix[rows] @ query
+
+                k = min(top_k, len(scores))
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best])]
+
+                return [
+                    {
+                        "id": ids[rows[i]],
+                        "score": float(scores[i]),
+                        **metadata[rows[i]]
+                    }
+                    for i in best
+                ]
+        except Exception as e:
+            print(f"Error searching similar articles: {str(e)}")
+            return []
+
+    def delete_article(self, article_id: str) -> bool:
+        """Delete an article from the vector store."""
+        try:
+            with self._lock:
+                row = self._id_to_row.get(article_id)
+                if row is None:
+                    return True
+                # Deletes are rare: rebuild the arrays and write a full snapshot
+                self._vectors = _Rows(np.delete(self._matrix, row, axis=0))
+                if self._assignment_rows is not None:
+                    self._assignments = np.delete(self._assignments, row)
+                self._ids = self._ids[:row] + self._ids[row + 1:]
+                self._metadata = self._metadata[:row] + self._metadata[row + 1:]
+                self._id_to_row = {aid: i for i, aid in enumerate(self._ids)}
+                self._update_ivf()
+                self._rebuild_filter_index()
+                self._delta_seq += 1
+                self._save()
+                self.generation += 1
+            return True
+        except Exception as e:
+            print(f"Error deleting article: {str(e)}")
+            return False
@@ -1,23 +1,56 @@
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from typing import List, Dict, Any
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Awaitable, Callable
+import functools
 import json
-import os
+import threading
+import time
+import urllib.parse
 
-from news_fetcher import NewsFetcher
-from embeddings import EmbeddingGenerator
-from vector_store import VectorStore
-from recommender import NewsRecommender
+import components
+from components import get_scheduler, get_service
+from search_filters import SearchFilter, parse_published
+from dedup import collapse_clusters
+from personalization import EVENT_KINDS
+from json_api import decode_cursor, encode_cursor, json_response, make_etag, not_modified, parse_fields, project
+from metrics import REGISTRY, SamplingProfiler, cache_collector, http_request_seconds, template_render_seconds
 from config import config
 from fastapi import HTTPException
 
-app = FastAPI(title="DS Task AI News API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Components are built on first use; warm them up without delaying startup
+    get_scheduler().start()
+    if config.warmup_on_startup:
+        threading.Thread(target=components.warmup, name="warmup", daemon=True).start()
+    yield
+    components.shutdown()
+
+app = FastAPI(title="DS Task AI News API", lifespan=lifespan)
 
 # Configure templates
 templates = Jinja2Templates(directory="backend/templates")
 
+SEARCH_MODES = ("auto", "hybrid", "lexical", "vector")
+
+def build_search_filter(
+    source: str = None,
+    category: str = None,
+    published_after: str = None,
+    published_before: str = None
+) -> SearchFilter:
+    """Build a search filter from query parameters, rejecting unparseable dates."""
+    bounds = {}
+    for name, value in (("published_after", published_after), ("published_before", published_before)):
+        if value:
+            bounds[name] = parse_published(value)
+            if bounds[name] is None:
+                raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 or RFC 822 date")
+    return SearchFilter(source=source or None, category=category or None, **bounds)
+
 def verify_api_token(token: str):
     if token == config.api_token:
         print(f"API key verified: {token}")
@@ -34,6 +67,36 @@ def from_json(value):
 
 templates.env.filters["from_json"] = from_json
 
+def render_template(name: str, context: Dict[str, Any]):
+    """Render a template response, recording the render time."""
+    with template_render_seconds.time(template=name):
+        return templates.TemplateResponse(name, context)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Record request latency per route, and profile the request when asked with ?profile=1."""
+    profiler = None
+    if config.profiling_enabled and request.query_params.get("profile"):
+        profiler = SamplingProfiler(config.profiler_interval)
+        profiler.start()
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    http_request_seconds.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=str(response.status_code)
+    )
+    if profiler is not None:
+        # Samples every thread, so concurrent requests show up in the profile too
+        return PlainTextResponse(
+            profiler.stop(),
+            status_code=response.status_code,
+            headers={"X-Profile-Samples": str(profiler.samples)}
+        )
+    return response
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,37 +106,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-news_fetcher = NewsFetcher()
-embedding_generator = EmbeddingGenerator()
-vector_store = VectorStore()
-recommender = NewsRecommender()
+def cache_stats_of(component: str, attribute: str):
+    """Stats of a component's cache, or None while the component is not built yet."""
+    cache = getattr(components.existing(component), attribute, None)
+    return cache.stats() if cache is not None else None
+
+CACHES = {
+    "query": ("service", "query_cache"),
+    "embedding": ("embedding_generator", "cache"),
+    "llm": ("recommender", "cache")
+}
+
+for cache_name, (component_name, attribute_name) in CACHES.items():
+    cache_collector(cache_name, functools.partial(cache_stats_of, component_name, attribute_name))
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Root endpoint returning the home page with links to other routes."""
-    return templates.TemplateResponse(
+    return render_template(
         "home.html",
         {"request": request}
     )
 
 @app.get("/fetch-news", response_class=HTMLResponse)
-def fetch_news(request: Request, token: str = Depends(verify_api_token)):
+async def fetch_news(request: Request, token: str = Depends(verify_api_token)):
     # print(f"Fetching news with token: {token}")
-    """Fetch news from RSS feeds and store in vector database."""
+    """Queue an ingest job and show the latest stored articles while it runs."""
     try:
-        result = news_fetcher.process()
-        if result["status"] == "error":
-            raise HTTPException(status_code=404, detail=result["message"])
-        
-        # Get the latest processed articles
-        processed_files = sorted(os.listdir(config.processed_news_dir), reverse=True)
-        if not processed_files:
-            raise HTTPException(status_code=404, detail="No processed articles found")
-        
-        latest_file = os.path.join(config.processed_news_dir, processed_files[0])
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            articles = json.load(f)
+        job = get_scheduler().trigger("fetch-news")
+        articles = await get_service().list_recent_articles()
             
         # Ensure each article has a link
         for article in articles:
@@ -81,51 +142,124 @@ def fetch_news(request: Request, token: str = Depends(verify_api_token)):
                 # If no link is available, use the article ID as a fallback
                 article['link'] = f"/article/{article.get('id', '')}"
         
-        return templates.TemplateResponse(
+        return render_template(
             "news.html",
-            {"request": request, "articles": articles}
+            {"request": request, "articles": articles, "job": job}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, token: str = Depends(verify_api_token)):
+    """Get the status and per-stage timings of an ingest job."""
+    job = get_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(token: str = Depends(verify_api_token)):
+    """Expose latency histograms, token usage and cache counters in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache-stats")
+async def cache_stats(token: str = Depends(verify_api_token)):
+    """Get hit ratios of the query, embedding and LLM response caches."""
+    return {name: cache_stats_of(component, attribute) for name, (component, attribute) in CACHES.items()}
+
+async def find_recommendations(
+    article_id: str,
+    query: str,
+    mode: str,
+    filters: SearchFilter,
+    top_k: int = None
+) -> List[Dict[str, Any]]:
+    """Find the articles recommended for an article ID or search query, possibly none."""
+    service = get_service()
+    top_k = top_k or config.top_k_results
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+
+    if article_id:
+        # Reuse the stored embedding of the article instead of embedding it again
+        article = await service.get_article(article_id, include_embedding=True)
+        if not article or not article.get("embedding"):
+            raise HTTPException(status_code=404, detail="Article not found")
+
+        # Search for similar articles, leaving out the article the recommendations are based on
+        # and its near-duplicates, and keeping one article per duplicate cluster
+        overfetch = config.dedup_overfetch if config.dedup_enabled else 1
+        similar_articles = await service.search_similar(
+            article["embedding"], top_k=top_k * overfetch + 1, filters=filters
+        )
+        similar_articles = collapse_clusters(
+            [a for a in similar_articles if a["id"] != article_id],
+            top_k,
+            exclude_clusters={article.get("cluster_id") or article_id}
+        )
+    elif query:
+        # Search with BM25 and/or the query embedding depending on the mode
+        similar_articles = await service.search_articles(query, top_k=top_k, mode=mode, filters=filters)
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Either article_id or query parameter is required"
+        )
+
+    # Ensure each article has a link
+    for article in similar_articles:
+        if 'link' not in article or not article['link']:
+            # If no link is available, use the article ID as a fallback
+            article['link'] = f"/article/{article.get('id', '')}"
+    return similar_articles
+
 @app.get("/recommend-news", response_class=HTMLResponse)
-async def recommend_news(request: Request, article_id: str = None, query: str = None, token: str = Depends(verify_api_token)):
-    """Get news recommendations based on article ID or search query."""
-    try:
-        if article_id:
-            # Get article from vector store
-            article = vector_store.search_similar([0] * 1024, top_k=1)  # Placeholder vector with correct dimension
-            if not article:
-                raise HTTPException(status_code=404, detail="Article not found")
-            
-            # Generate query embedding from article content
-            query_embedding = embedding_generator.get_query_embedding(
-                f"{article[0]['title']} {article[0]['content']}"
-            )
-        elif query:
-            # Generate query embedding from search query
-            query_embedding = embedding_generator.get_query_embedding(query)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Either article_id or query parameter is required"
-            )
+async def recommend_news(
+    request: Request,
+    article_id: str = None,
+    query: str = None,
+    mode: str = "auto",
+    source: str = None,
+    category: str = None,
+    published_after: str = None,
+    published_before: str = None,
+    stream: bool = None,
+    token: str = Depends(verify_api_token)
+):
+    """Get news recommendations based on article ID or search query.
 
-        # Search for similar articles
-        similar_articles = vector_store.search_similar(query_embedding)
+    With ``stream`` the page is rendered as soon as the articles are found and
+    loads the insights from ``/recommend-news/insights`` as they are generated.
+    """
+    try:
+        filters = build_search_filter(source, category, published_after, published_before)
+        similar_articles = await find_recommendations(article_id, query, mode, filters)
         if not similar_articles:
             raise HTTPException(status_code=404, detail="No similar articles found")
 
-        # Ensure each article has a link
-        for article in similar_articles:
-            if 'link' not in article or not article['link']:
-                # If no link is available, use the article ID as a fallback
-                article['link'] = f"/article/{article.get('id', '')}"
+        if stream is None:
+            stream = config.stream_insights
+        if stream:
+            # The insights endpoint analyzes exactly the rendered articles instead of searching again
+            stream_query = urllib.parse.urlencode(
+                [("ids", article["id"]) for article in similar_articles] + [("token", request.query_params.get("token", ""))]
+            )
+            return render_template(
+                "recommendations.html",
+                {
+                    "request": request,
+                    "articles": similar_articles,
+                    "insights": None,
+                    "insights_stream_url": f"/recommend-news/insights?{stream_query}"
+                }
+            )
 
         # Generate insights for the articles
-        insights = recommender.analyze_articles(similar_articles)
+        insights = await get_service().analyze_articles(similar_articles)
 
-        return templates.TemplateResponse(
+        return render_template(
             "recommendations.html",
             {
                 "request": request,
@@ -133,32 +267,253 @@ async def recommend_news(request: Request, article_id: str = None, query: str =
                 "insights": insights
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/article/{article_id}")
-async def get_article(article_id: str, token: str = Depends(verify_api_token)):
-    """Get a specific article and its summary."""
+@app.get("/recommend-news/insights")
+async def recommend_news_insights(
+    ids: List[str] = Query(None),
+    article_id: str = None,
+    query: str = None,
+    mode: str = "auto",
+    source: str = None,
+    category: str = None,
+    published_after: str = None,
+    published_before: str = None,
+    token: str = Depends(verify_api_token)
+):
+    """Stream the insights for a recommendation as server-sent events.
+
+    ``ids`` names the articles to analyze. Without it, the recommendation is searched again.
+    """
     try:
-        # Search for the article
-        articles = vector_store.search_similar([0] * 1024, top_k=1)  # Placeholder vector with correct dimension
-        if not articles:
+        if ids:
+            similar_articles = await get_service().get_articles(ids)
+        else:
+            filters = build_search_filter(source, category, published_after, published_before)
+            similar_articles = await find_recommendations(article_id, query, mode, filters)
+        if not similar_articles:
+            raise HTTPException(status_code=404, detail="No similar articles found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        async for key, value in get_service().stream_insights(similar_articles):
+            if key == "done":
+                event, data = "done", value
+            else:
+                event, data = "insight", {"key": key, "value": value}
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def api_page_size(limit: int = None) -> int:
+    """Validate the page size of a JSON API request."""
+    if limit is None:
+        return config.api_page_size
+    if not 1 <= limit <= config.api_max_page_size:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.api_max_page_size}")
+    return limit
+
+def ensure_links(articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Use the article route as the link of articles that have none."""
+    for article in articles:
+        if not article.get("link"):
+            article["link"] = f"/article/{article.get('id', '')}"
+    return articles
+
+async def ranked_page(
+    request: Request,
+    find: Callable[[int], Awaitable[List[Dict[str, Any]]]],
+    limit: int,
+    cursor: str,
+    fields: str
+):
+    """Respond with a page of ranked results, found by ``find(top_k)``.
+
+    The cursor holds an offset into the ranking; each page runs the search for
+    the results up to its end, which the query cache mostly serves.
+    """
+    limit = api_page_size(limit)
+    projection = parse_fields(fields)
+    offset = decode_cursor(cursor, "offset") or 0
+    if offset >= config.api_max_results:
+        raise HTTPException(status_code=400, detail=f"Results are available up to {config.api_max_results}")
+    etag = make_etag(await get_service().search_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    end = min(offset + limit, config.api_max_results)
+    # One more than the page tells whether there is a next page
+    results = await find(min(end + 1, config.api_max_results))
+    has_more = len(results) > end and end < config.api_max_results
+    return json_response(request, {
+        "data": project(ensure_links(results[offset:end]), projection),
+        "next_cursor": encode_cursor({"offset": end}) if has_more else None
+    }, etag)
+
+@app.get("/api/v1/articles")
+async def api_list_articles(
+    request: Request,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None,
+    token: str = Depends(verify_api_token)
+):
+    """List stored articles as JSON, most recently added first, a page at a time."""
+    limit = api_page_size(limit)
+    projection = parse_fields(fields)
+    before = decode_cursor(cursor, "before")
+    service = get_service()
+    etag = make_etag(await service.articles_version())
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+
+    articles, next_before = await service.list_articles_page(limit, before)
+    return json_response(request, {
+        "data": project(ensure_links(articles), projection),
+        "next_cursor": encode_cursor({"before": next_before}) if next_before is not None else None
+    }, etag)
+
+@app.get("/api/v1/search")
+async def api_search(
+    request: Request,
+    q: str,
+    mode: str = "auto",
+    source: str = None,
+    category: str = None,
+    published_after: str = None,
+    published_before: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None,
+    token: str = Depends(verify_api_token)
+):
+    """Search articles as JSON, best match first, a page at a time."""
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    filters = build_search_filter(source, category, published_after, published_before)
+    return await ranked_page(
+        request,
+        lambda top_k: get_service().search_articles(q, top_k=top_k, mode=mode, filters=filters),
+        limit,
+        cursor,
+        fields
+    )
+
+@app.get("/api/v1/recommendations")
+async def api_recommendations(
+    request: Request,
+    article_id: str = None,
+    query: str = None,
+    mode: str = "auto",
+    source: str = None,
+    category: str = None,
+    published_after: str = None,
+    published_before: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None,
+    token: str = Depends(verify_api_token)
+):
+    """Get the recommendations for an article ID or search query as JSON, without insights."""
+    filters = build_search_filter(source, category, published_after, published_before)
+    return await ranked_page(
+        request,
+        lambda top_k: find_recommendations(article_id, query, mode, filters, top_k),
+        limit,
+        cursor,
+        fields
+    )
+
+async def resolve_user(username: str) -> int:
+    """Return the id of a user, or raise a 404 if there is no such user."""
+    user_id = await get_service().get_user_id(username)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_id
+
+@app.get("/feed")
+async def get_feed(
+    user: str,
+    top_k: int = None,
+    diversity: float = None,
+    token: str = Depends(verify_api_token)
+):
+    """Get a user's feed of recent articles ranked against their interests."""
+    try:
+        if top_k is not None and top_k < 1:
+            raise HTTPException(status_code=400, detail="top_k must be at least 1")
+        if diversity is not None and not 0 <= diversity <= 1:
+            raise HTTPException(status_code=400, detail="diversity must be between 0 and 1")
+        user_id = await resolve_user(user)
+        articles, personalized = await get_service().get_feed(user_id, top_k, diversity)
+        for article in articles:
+            if 'link' not in article or not article['link']:
+                article['link'] = f"/article/{article.get('id', '')}"
+        return {"user": user, "personalized": personalized, "articles": articles}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/events")
+async def record_event(
+    user: str,
+    article_id: str,
+    kind: str = "click",
+    token: str = Depends(verify_api_token)
+):
+    """Record that a user viewed or clicked an article, updating their interest vector."""
+    try:
+        if kind not in EVENT_KINDS:
+            raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(EVENT_KINDS)}")
+        user_id = await resolve_user(user)
+        if not await get_service().record_event(user_id, article_id, kind):
             raise HTTPException(status_code=404, detail="Article not found")
+        return {"recorded": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/article/{article_id:path}")
+async def get_article(article_id: str, user: str = None, token: str = Depends(verify_api_token)):
+    """Get a specific article and its summary, recording a view when a user is given."""
+    try:
+        service = get_service()
+        # Uses the summary precomputed at ingest, generating and storing it on a miss
+        article, summary = await service.get_article_with_summary(article_id)
+        if not article:
+            raise HTTPException(status_code=404, detail="Article not found")
+
+        if user:
+            user_id = await service.get_user_id(user)
+            if user_id is not None:
+                await service.record_event(user_id, article_id, "view")
 
-        article = articles[0]
-        
         # Ensure the article has a link
         if 'link' not in article or not article['link']:
             # If no link is available, use the article ID as a fallback
             article['link'] = f"/article/{article.get('id', '')}"
-        
-        # Generate summary
-        summary = recommender.generate_summary(article)
 
         return {
             "article": article,
             "summary": summary
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
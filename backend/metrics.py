@@ -0,0 +1,207 @@
+import bisect
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines.extend(f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items())
+        return lines
+
+
+class Histogram:
+    """Latency histogram with cumulative buckets, a sum and a count per label set."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per label set: one count per bucket, then +Inf, sum and count
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 3))
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe the wall time of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, counts in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {counts[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Metrics served at /metrics in the Prometheus text exposition format.
+
+    Collectors are callables run at scrape time that return
+    ``(name, type, help, labels, value)`` samples, for values such as cache
+    counters that are already tracked elsewhere.
+    """
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        collected: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in collectors:
+            for name, kind, documentation, labels, value in collector():
+                _, _, samples = collected.setdefault(name, (kind, documentation, []))
+                samples.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+        for name, (kind, documentation, samples) in collected.items():
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", *samples])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+feed_fetch_seconds = REGISTRY.histogram("news_feed_fetch_seconds", "Time to fetch and parse one RSS feed.")
+html_clean_seconds = REGISTRY.histogram("news_html_clean_seconds", "Time to clean the HTML of one feed's entries.")
+embedding_batch_seconds = REGISTRY.histogram("news_embedding_batch_seconds", "Time of one embedding request.")
+embedding_texts_total = REGISTRY.counter("news_embedding_texts_total", "Texts sent to the embedding API.")
+vector_upsert_seconds = REGISTRY.histogram("news_vector_upsert_seconds", "Time of one vector store upsert.")
+vector_query_seconds = REGISTRY.histogram("news_vector_query_seconds", "Time of one vector store query.")
+llm_request_seconds = REGISTRY.histogram("news_llm_request_seconds", "Time of one LLM completion request.")
+llm_tokens_total = REGISTRY.counter("news_llm_tokens_total", "LLM tokens used, by prompt and token kind.")
+template_render_seconds = REGISTRY.histogram("news_template_render_seconds", "Time to render one template.")
+ingest_stage_seconds = REGISTRY.histogram("news_ingest_stage_seconds", "Time of one ingest pipeline stage.")
+http_request_seconds = REGISTRY.histogram("news_http_request_seconds", "Time to serve one HTTP request.")
+
+
+def cache_collector(name: str, stats: Callable[[], Optional[Dict[str, float]]]):
+    """Register a cache's hit/miss counters, read from its stats() at scrape time."""
+    def collect():
+        values = stats()
+        if not values:
+            return []
+        samples = []
+        for key, value in values.items():
+            if key.endswith("hits") or key.endswith("misses"):
+                level, _, outcome = key.rpartition("_")
+                labels = {"cache": f"{name}_{level}" if level else name}
+                samples.append((f"news_cache_{outcome}_total", "counter", f"Cache {outcome}.", labels, value))
+        return samples
+    REGISTRY.register_collector(collect)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval while it runs.
+
+    The result is in the collapsed-stack format used by flame graph tools:
+    one ``frame;frame;frame count`` line per distinct stack.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = ";".join(
+                    f"{entry.name} ({entry.filename.rsplit('/', 1)[-1]}:{entry.lineno})"
+                    for entry in traceback.extract_stack(frame)
+                )
+                self._stacks[stack] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
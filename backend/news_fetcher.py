@@ -1,15 +1,26 @@
+import asyncio
 import feedparser
+import httpx
 import json
 import os
 import logging
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup
-import re
 import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
 from config import config
+from html_cleaner import clean_html, clean_html_many
 from embeddings import EmbeddingGenerator
-from vector_store import VectorStore
+from vector_store import VectorStore, create_vector_store
+from seen_articles import SeenArticleIndex
+from article_store import ArticleStore
+from processed_store import ProcessedArticleStore
+from lexical_index import BM25Index
+from dedup import DuplicateIndex
+from search_filters import parse_published
+from recommender import NewsRecommender, SUMMARY_FALLBACK
+from metrics import feed_fetch_seconds, html_clean_seconds, ingest_stage_seconds
 
 # Configure logging
 logging.basicConfig(
@@ -22,46 +33,112 @@ logging.basicConfig(
 )
 logger = logging.getLogger('NewsFetcher')
 
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    """Record the wall time of a pipeline stage in seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        ingest_stage_seconds.observe(timings[stage], stage=stage)
+
 class NewsFetcher:
     def __init__(
         self,
         embedding_generator: Optional[EmbeddingGenerator] = None,
         vector_store: Optional[VectorStore] = None,
+        seen_index: Optional[SeenArticleIndex] = None,
+        article_store: Optional[ArticleStore] = None,
+        recommender: Optional[NewsRecommender] = None,
+        processed_store: Optional[ProcessedArticleStore] = None,
+        lexical_index: Optional[BM25Index] = None,
+        duplicate_index: Optional[DuplicateIndex] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
         max_retries: int = 3,
         retry_delay: int = 5
     ):
         self.feeds = config.rss_feeds
         self.embedding_generator = embedding_generator or EmbeddingGenerator()
-        self.vector_store = vector_store or VectorStore()
+        # Compare with None: an empty local vector store or lexical index is falsy
+        self.vector_store = vector_store if vector_store is not None else create_vector_store()
+        self.seen_index = seen_index or SeenArticleIndex()
+        self.article_store = article_store or ArticleStore()
+        self.processed_store = processed_store or ProcessedArticleStore()
+        self.lexical_index = lexical_index if lexical_index is not None else BM25Index()
+        if duplicate_index is None and config.dedup_enabled:
+            duplicate_index = DuplicateIndex(
+                embedding_lookup=self.article_store.get_embeddings,
+                neighbor_lookup=self.vector_store.search_similar
+            )
+        self.duplicate_index = duplicate_index
+        if recommender is None and config.precompute_summaries:
+            recommender = NewsRecommender()
+        self.recommender = recommender
+        self.transport = transport  # Replaces the network, e.g. with httpx.MockTransport for offline runs
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.feed_state = self._load_feed_state()
+        self._pending_feed_state: Dict[str, Dict[str, str]] = {}
+        self.not_modified_feeds: List[str] = []
         logger.info("NewsFetcher initialized with %d RSS feeds", len(self.feeds))
 
     def clean_html_content(self, html_content: str) -> str:
         """Clean HTML content and extract plain text."""
         logger.debug("Cleaning HTML content of length %d", len(html_content))
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get text content
-        text = soup.get_text()
-        
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Remove extra spaces
-        text = re.sub(r'\s+', ' ', text)
-        
-        cleaned_text = text.strip()
+        cleaned_text = clean_html(html_content)
         logger.debug("Cleaned text length: %d", len(cleaned_text))
         return cleaned_text
 
+    def _load_feed_state(self) -> Dict[str, Dict[str, str]]:
+        """Load the ETag/Last-Modified validators saved by previous runs."""
+        if not os.path.exists(config.feed_state_path):
+            return {}
+        try:
+            with open(config.feed_state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Could not read feed state %s: %s", config.feed_state_path, str(e))
+            return {}
+
+    def commit_feed_state(self):
+        """Persist validators from the last fetch once its articles are safely stored."""
+        if not self._pending_feed_state:
+            return
+        self.feed_state.update(self._pending_feed_state)
+        self._pending_feed_state = {}
+        tmp_path = f"{config.feed_state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.feed_state, f, indent=2)
+        os.replace(tmp_path, config.feed_state_path)
+
+    def parse_feed_entries(self, feed) -> List[Dict[str, Any]]:
+        """Convert parsed feed entries into article dicts."""
+        articles = []
+        # Get raw content with HTML and clean it in one batch
+        raw_contents = [entry.get("summary", "") for entry in feed.entries]
+        with html_clean_seconds.time():
+            clean_contents = clean_html_many(raw_contents)
+
+        for entry, raw_content, clean_content in zip(feed.entries, raw_contents, clean_contents):
+            published_defaulted = "published" not in entry
+            published = entry.get("published", datetime.now().isoformat())
+            article = {
+                "title": entry.title,
+                "raw_content": raw_content,  # Store original HTML content
+                "content": clean_content,     # Store cleaned text content
+                "link": entry.get("link", ""),
+                "published": published,
+                "published_ts": parse_published(published),  # Sortable epoch seconds for date filters
+                "source": feed.feed.get("title", "Unknown"),
+                "categories": [tag.term for tag in entry.get("tags", [])],
+                "id": entry.get("id", entry.get("link", "")),
+            }
+            if published_defaulted:
+                article["published_defaulted"] = True  # Changes every run, so kept out of the fingerprint
+            articles.append(article)
+        return articles
+
     def fetch_rss_news(self, feed_url: str) -> List[Dict[str, Any]]:
         """Fetch news articles from a single RSS feed with retry logic."""
         logger.info("Fetching news from feed: %s", feed_url)
@@ -78,25 +155,7 @@ class NewsFetcher:
                         continue
                     return []
                 
-                for entry in feed.entries:
-                    # Get raw content with HTML
-                    raw_content = entry.get("summary", "")
-                    
-                    # Clean HTML content
-                    clean_content = self.clean_html_content(raw_content)
-                    
-                    article = {
-                        "title": entry.title,
-                        "raw_content": raw_content,  # Store original HTML content
-                        "content": clean_content,     # Store cleaned text content
-                        "link": entry.get("link", ""),
-                        "published": entry.get("published", datetime.now().isoformat()),
-                        "source": feed.feed.get("title", "Unknown"),
-                        "categories": [tag.term for tag in entry.get("tags", [])],
-                        "id": entry.get("id", entry.get("link", "")),
-                    }
-                    articles.append(article)
-                
+                articles = self.parse_feed_entries(feed)
                 logger.info("Fetched %d articles from %s", len(articles), feed_url)
                 return articles
                 
@@ -110,19 +169,94 @@ class NewsFetcher:
                                feed_url, self.max_retries)
                     return []
 
-    def fetch_all_news(self) -> List[Dict[str, Any]]:
-        """Fetch news from all configured RSS feeds."""
+    async def fetch_rss_news_async(
+        self,
+        client: httpx.AsyncClient,
+        feed_url: str,
+        host_semaphore: asyncio.Semaphore
+    ) -> List[Dict[str, Any]]:
+        """Fetch a single RSS feed with a conditional GET, skipping it on 304 Not Modified."""
+        headers = {}
+        validators = self.feed_state.get(feed_url, {})
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        for attempt in range(self.max_retries):
+            try:
+                async with host_semaphore:
+                    response = await client.get(feed_url, headers=headers)
+
+                if response.status_code == 304:
+                    logger.info("Feed not modified since last fetch: %s", feed_url)
+                    self.not_modified_feeds.append(feed_url)
+                    return []
+                response.raise_for_status()
+
+                feed = await asyncio.to_thread(
+                    feedparser.parse, response.content, response_headers=dict(response.headers)
+                )
+                if not feed.entries:
+                    logger.warning("No entries found in feed %s (attempt %d/%d)",
+                                 feed_url, attempt + 1, self.max_retries)
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(self.retry_delay)
+                        continue
+                    return []
+
+                articles = await asyncio.to_thread(self.parse_feed_entries, feed)
+                self._pending_feed_state[feed_url] = {
+                    "etag": response.headers.get("ETag", ""),
+                    "last_modified": response.headers.get("Last-Modified", "")
+                }
+                logger.info("Fetched %d articles from %s", len(articles), feed_url)
+                return articles
+
+            except Exception as e:
+                logger.error("Error fetching from %s (attempt %d/%d): %s",
+                           feed_url, attempt + 1, self.max_retries, str(e))
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay)
+                else:
+                    logger.error("Failed to fetch from %s after %d attempts",
+                               feed_url, self.max_retries)
+                    return []
+
+    async def fetch_all_news_async(self) -> List[Dict[str, Any]]:
+        """Fetch all configured RSS feeds concurrently over one pooled HTTP client."""
         logger.info("Starting to fetch news from all %d feeds", len(self.feeds))
-        all_articles = []
-        
+        self.not_modified_feeds = []
+        self._pending_feed_state = {}
+        host_semaphores: Dict[str, asyncio.Semaphore] = {}
         for feed_url in self.feeds:
-            articles = self.fetch_rss_news(feed_url)
-            all_articles.extend(articles)
-            logger.info("Successfully fetched %d articles from %s", len(articles), feed_url)
-        
-        logger.info("Total articles fetched: %d", len(all_articles))
+            host = urlparse(feed_url).netloc
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(config.feed_concurrency_per_host)
+
+        async with httpx.AsyncClient(
+            timeout=config.feed_timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=config.feed_max_connections),
+            transport=self.transport
+        ) as client:
+            async def fetch(feed_url: str) -> List[Dict[str, Any]]:
+                with feed_fetch_seconds.time(feed=feed_url):
+                    return await self.fetch_rss_news_async(
+                        client, feed_url, host_semaphores[urlparse(feed_url).netloc]
+                    )
+
+            results = await asyncio.gather(*[fetch(feed_url) for feed_url in self.feeds])
+
+        all_articles = [article for articles in results for article in articles]
+        logger.info("Total articles fetched: %d (%d feeds not modified)",
+                    len(all_articles), len(self.not_modified_feeds))
         return all_articles
 
+    def fetch_all_news(self) -> List[Dict[str, Any]]:
+        """Fetch news from all configured RSS feeds."""
+        return asyncio.run(self.fetch_all_news_async())
+
     def save_raw_articles(self, articles: List[Dict[str, Any]]) -> str:
         """Save raw articles to a JSON file."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -136,67 +270,145 @@ class NewsFetcher:
         logger.info("Raw articles saved successfully")
         return filepath
 
-    def save_processed_articles(self, articles: List[Dict[str, Any]]) -> str:
-        """Save processed articles with embeddings to a JSON file."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"processed_news_{timestamp}.json"
-        filepath = os.path.join(config.processed_news_dir, filename)
-        
-        # Create a copy of articles without raw_content for processed storage
-        processed_articles = []
-        for article in articles:
-            processed_article = article.copy()
-            processed_article.pop('raw_content', None)  # Remove raw_content from processed articles
-            processed_articles.append(processed_article)
-        
-        logger.info("Saving %d processed articles to %s", len(processed_articles), filepath)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(processed_articles, f, ensure_ascii=False, indent=2)
-        
-        logger.info("Processed articles saved successfully")
-        return filepath
+    def save_processed_articles(self, articles: List[Dict[str, Any]]) -> Optional[str]:
+        """Append processed articles with embeddings to the columnar processed store."""
+        logger.info("Saving %d processed articles to %s", len(articles), self.processed_store.directory)
+        segment_path = self.processed_store.append(articles)
+        logger.info("Processed articles saved successfully to %s", segment_path)
+        return segment_path
+
+    def summarize_articles(self, articles: List[Dict[str, Any]]) -> int:
+        """Generate and store summaries for articles, several per LLM call."""
+        stored = 0
+        for article, summary in zip(articles, self.recommender.summarize_many(articles)):
+            if summary == SUMMARY_FALLBACK:
+                continue
+            self.article_store.set_summary(article["id"], summary)
+            stored += 1
+        return stored
 
     def process(self) -> Dict[str, Any]:
-        """Main process to fetch, process, and store news articles."""
+        """Main process to fetch, process, and store new or changed news articles.
+
+        The result includes ``timings``, the duration in seconds of each stage that ran.
+        """
         logger.info("Starting news processing pipeline")
+        timings: Dict[str, float] = {}
         
         # Fetch articles
         logger.info("Step 1: Fetching articles from RSS feeds")
-        articles = self.fetch_all_news()
+        with _timed(timings, "fetch"):
+            articles = self.fetch_all_news()
         if not articles:
+            if self.not_modified_feeds:
+                logger.info("No feeds changed since the last run")
+                return {
+                    "status": "success",
+                    "message": "No feeds changed since the last run",
+                    "article_count": 0,
+                    "new_count": 0,
+                    "updated_count": 0,
+                    "unchanged_count": 0,
+                    "timings": timings
+                }
             logger.warning("No articles found during fetching")
-            return {"status": "error", "message": "No articles found"}
+            return {"status": "error", "message": "No articles found", "timings": timings}
+
+        # Keep only articles that are new or changed since they were last ingested
+        with _timed(timings, "classify"):
+            unique_articles = list({article["id"]: article for article in articles}.values())
+            new_articles, updated_articles, unchanged_articles = self.seen_index.classify(unique_articles)
+            changed_articles = new_articles + updated_articles
+        counts = {
+            "article_count": len(articles),
+            "new_count": len(new_articles),
+            "updated_count": len(updated_articles),
+            "unchanged_count": len(unchanged_articles)
+        }
+        logger.info("Found %d new, %d updated and %d unchanged articles",
+                    counts["new_count"], counts["updated_count"], counts["unchanged_count"])
+        if not changed_articles:
+            self.commit_feed_state()
+            logger.info("No new or updated articles to process")
+            return {"status": "success", "message": "No new or updated articles", **counts, "timings": timings}
 
         # Save raw articles
         logger.info("Step 2: Saving raw articles")
-        raw_filepath = self.save_raw_articles(articles)
+        with _timed(timings, "save_raw"):
+            raw_filepath = self.save_raw_articles(changed_articles)
 
         # Generate embeddings
-        logger.info("Step 3: Generating embeddings for %d articles", len(articles))
-        articles_with_embeddings = self.embedding_generator.process_articles(articles)
+        logger.info("Step 3: Generating embeddings for %d articles", len(changed_articles))
+        with _timed(timings, "embed"):
+            articles_with_embeddings = self.embedding_generator.process_articles(changed_articles)
         logger.info("Embeddings generated successfully")
+        if self.embedding_generator.cache is not None:
+            logger.info("Embedding cache stats: %s", self.embedding_generator.cache.stats())
+
+        # Assign near-duplicate cluster ids so searches can collapse syndicated copies
+        if self.duplicate_index is not None:
+            with _timed(timings, "dedup"):
+                embedded = [a for a in articles_with_embeddings if "embedding" in a]
+                counts["duplicate_count"] = self.duplicate_index.assign(embedded)
+            logger.info("Found %d near-duplicates of stored articles", counts["duplicate_count"])
 
         # Save processed articles
         logger.info("Step 4: Saving processed articles with embeddings")
-        processed_filepath = self.save_processed_articles(articles_with_embeddings)
+        with _timed(timings, "save_processed"):
+            processed_filepath = self.save_processed_articles(articles_with_embeddings)
 
         # Store in vector database
         logger.info("Step 5: Storing articles in vector database")
-        success = self.vector_store.upsert_articles(articles_with_embeddings)
-        
-        if success:
+        with _timed(timings, "upsert"):
+            # The article store is written first, so a search never finds a vector without its article
+            to_store = [a for a in articles_with_embeddings if "embedding" in a]
+            previous = self.article_store.get_many([a["id"] for a in to_store], include_embedding=True)
+            self.article_store.put_many(to_store)
+            upsert = self.vector_store.upsert_articles(articles_with_embeddings)
+            upserted_ids = set(upsert.upserted_ids)
+            if upsert.failed_ids:
+                self.article_store.revert(upsert.failed_ids, previous)
+            # Articles that failed to embed or upsert stay unseen so the next run retries them
+            stored_articles = [a for a in articles_with_embeddings if a["id"] in upserted_ids]
+            if self.duplicate_index is not None:
+                self.duplicate_index.commit(embedded, upserted_ids)
+            if stored_articles:
+                self.lexical_index.add_articles(stored_articles)
+                self.seen_index.mark_seen(stored_articles)
+            if len(stored_articles) == len(changed_articles):
+                # Feeds are only marked as fetched once everything from them is stored
+                self.commit_feed_state()
+        counts["stored_count"] = len(stored_articles)
+        counts["embed_failed_count"] = sum(1 for a in articles_with_embeddings if "embedding" not in a)
+        counts["upsert_failed_count"] = len(upsert.failed_ids)
+
+        if len(stored_articles) == len(changed_articles):
+            status, message = "success", "Articles processed and stored successfully"
             logger.info("Articles successfully stored in vector database")
+        elif stored_articles:
+            status = "partial"
+            failed_count = len(changed_articles) - len(stored_articles)
+            message = f"Stored {len(stored_articles)} articles, {failed_count} failed and will be retried"
+            logger.warning(message)
         else:
+            status, message = "error", "Failed to store articles"
             logger.error("Failed to store articles in vector database")
 
         result = {
-            "status": "success" if success else "error",
-            "message": "Articles processed and stored successfully" if success else "Failed to store articles",
+            "status": status,
+            "message": message,
             "raw_filepath": raw_filepath,
             "processed_filepath": processed_filepath,
-            "article_count": len(articles)
+            **counts,
+            "timings": timings
         }
+
+        # Precompute summaries so article requests only read the stored summary
+        if stored_articles and self.recommender is not None:
+            logger.info("Step 6: Generating summaries for %d articles", len(stored_articles))
+            with _timed(timings, "summarize"):
+                result["summary_count"] = self.summarize_articles(stored_articles)
+            logger.info("Generated %d summaries", result["summary_count"])
         
         logger.info("News processing pipeline completed with status: %s", result["status"])
         return result
-
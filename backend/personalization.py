@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+
+from config import config
+from article_store import ArticleStore
+from dedup import collapse_clusters
+
+EVENT_KINDS = ("view", "click")
+
+
+class UserProfileStore:
+    """Interaction events and time-decayed interest vectors of the users in ``users.db``.
+
+    A user's interest vector is the sum of the normalized embeddings of the
+    articles they viewed or clicked, weighted by event kind and halved every
+    ``interest_half_life`` seconds. It is stored with the time of its last
+    update, so recording an event decays and adds a single vector: O(dim) work
+    and one row write, however long the history.
+    """
+
+    def __init__(self, path: Optional[str] = None, half_life: Optional[float] = None):
+        self.path = path or config.users_db_path
+        self.half_life = half_life or config.interest_half_life
+        self.event_weights = {"view": config.interest_view_weight, "click": config.interest_click_weight}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Same schema as the existing table, so a fresh database can be looked up too
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                article_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS user_events_user ON user_events (user_id, created_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_interests (
+                user_id INTEGER PRIMARY KEY REFERENCES users (id),
+                vector BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                event_count INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get_user_id(self, username: str) -> Optional[int]:
+        """Return the id of a user, or None if there is no such user."""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def record_event(
+        self,
+        user_id: int,
+        article_id: str,
+        kind: str,
+        embedding: List[float],
+        timestamp: Optional[float] = None
+    ) -> bool:
+        """Log an event and fold the article's embedding into the user's interest vector."""
+        try:
+            weight = self.event_weights[kind]
+            now = time.time() if timestamp is None else timestamp
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT vector, updated_at, event_count FROM user_interests WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is None or len(row[0]) != vector.nbytes:
+                    interest, event_count = weight * vector, 1
+                else:
+                    decay = 0.5 ** (max(now - row[1], 0.0) / self.half_life)
+                    interest = np.frombuffer(row[0], dtype=np.float32) * decay + weight * vector
+                    event_count = row[2] + 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO user_interests (user_id, vector, updated_at, event_count) "
+                    "VALUES (?, ?, ?, ?)",
+                    (user_id, interest.astype(np.float32).tobytes(), now, event_count)
+                )
+                self._conn.execute(
+                    "INSERT INTO user_events (user_id, article_id, kind, created_at) VALUES (?, ?, ?, ?)",
+                    (user_id, article_id, kind, now)
+                )
+                self._conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error recording {kind} event for user {user_id}: {str(e)}")
+            return False
+
+    def interest(self, user_id: int) -> Optional[np.ndarray]:
+        """Return the user's normalized interest vector, or None before their first event.
+
+        Decay scales the whole vector, so it does not change the ranking and is
+        not applied until the next event.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM user_interests WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def seen_ids(self, user_id: int, limit: Optional[int] = None) -> set:
+        """Return the ids of the articles in the user's most recent events."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT article_id FROM user_events WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, limit or config.feed_seen_limit)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+
+def mmr(relevance: np.ndarray, matrix: np.ndarray, top_k: int, diversity: float) -> List[int]:
+    """Pick rows by maximal marginal relevance.
+
+    Each step takes the row with the best ``(1 - diversity) * relevance -
+    diversity * similarity`` to the rows picked so far, so a diversity of 0 is a
+    plain ranking by relevance.
+    """
+    available = np.ones(len(relevance), dtype=bool)
+    max_similarity = np.zeros(len(relevance), dtype=np.float32)
+    selected: List[int] = []
+    for _ in range(min(top_k, len(relevance))):
+        scores = (1 - diversity) * relevance - diversity * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, matrix @ matrix[best], out=max_similarity)
+    return selected
+
+
+class FeedRanker:
+    """Ranks the newest articles against an interest vector without leaving the process.
+
+    The embeddings of the ``feed_candidates`` most recently stored articles are
+    kept as a normalized float32 matrix. It is reloaded when the article store
+    changes, or after ``feed_refresh_seconds`` to pick up other writers, so a
+    feed is one matrix-vector product plus an optional MMR re-rank of the best
+    candidates.
+    """
+
+    def __init__(
+        self,
+        article_store: Optional[ArticleStore] = None,
+        candidates: Optional[int] = None,
+        refresh_seconds: Optional[float] = None
+    ):
+        self.article_store = article_store or ArticleStore()
+        self.candidates = candidates or config.feed_candidates
+        self.refresh_seconds = config.feed_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._articles: List[Dict[str, Any]] = []
+        self._matrix = np.empty((0, config.vector_dimension), dtype=np.float32)
+        self._generation: Optional[int] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _snapshot(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Return the candidate articles and their embedding matrix, reloading them when stale."""
+        with self._lock:
+            stale = (
+                self._generation != self.article_store.generation
+                or time.monotonic() - self._loaded_at > self.refresh_seconds
+            )
+            if stale:
+                generation = self.article_store.generation
+                articles = [
+                    article for article in self.article_store.list_recent(self.candidates, include_embedding=True)
+                    if article.get("embedding")
+                ]
+                matrix = np.asarray([article.pop("embedding") for article in articles], dtype=np.float32)
+                if len(matrix):
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    norms[norms == 0] = 1.0
+                    matrix /= norms
+                else:
+                    matrix = matrix.reshape(0, config.vector_dimension)
+                self._articles, self._matrix = articles, matrix
+                self._generation, self._loaded_at = generation, time.monotonic()
+            return self._articles, self._matrix
+
+    def rank(
+        self,
+        interest: Optional[np.ndarray],
+        top_k: Optional[int] = None,
+        exclude: Iterable[str] = (),
+        diversity: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Return up to ``top_k`` articles for the interest vector, newest first without one.
+
+        Articles in ``exclude`` are left out and near-duplicates are collapsed
+        to the best-ranked article of each cluster.
+        """
+        top_k = top_k or config.feed_size
+        diversity = config.feed_diversity if diversity is None else diversity
+        articles, matrix = self._snapshot()
+        excluded = set(exclude)
+        rows = np.array([i for i, article in enumerate(articles) if article["id"] not in excluded], dtype=np.int64)
+        if not len(rows):
+            return []
+        limit = top_k * config.dedup_overfetch if config.dedup_enabled else top_k
+
+        if interest is None or len(interest) != matrix.shape[1]:
+            # Not personalized yet: the newest articles
+            order = rows[:limit]
+            return collapse_clusters([dict(articles[i]) for i in order], top_k)
+
+        relevance = matrix[rows] @ interest.astype(np.float32, copy=False)
+        # Only the best candidates are worth re-ranking
+        pool = min(len(rows), max(limit * config.feed_mmr_pool_factor, limit))
+        best = np.argpartition(-relevance, pool - 1)[:pool]
+        best = best[np.argsort(-relevance[best])]
+        if diversity > 0:
+            best = best[mmr(relevance[best], matrix[rows[best]], limit, diversity)]
+        return collapse_clusters(
+            [{**articles[rows[i]], "score": float(relevance[i])} for i in best[:limit]], top_k
+        )
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+from config import config
+
+SEGMENT_PREFIX = "segment_"
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+
+class ProcessedArticleStore:
+    """Append-only columnar store for processed articles.
+
+    Each save writes a segment directory holding a float32 ``embeddings.npy``
+    matrix and a compact ``metadata.json`` table with one row per matrix row.
+    Once there are more than ``max_segments`` segments they are compacted into
+    one, keeping the newest version of each article and dropping rows older
+    than ``retention_days``.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_segments: Optional[int] = None,
+        retention_days: Optional[float] = None
+    ):
+        self.directory = directory or config.processed_news_dir
+        self.max_segments = max_segments or config.processed_max_segments
+        self.retention_days = config.processed_retention_days if retention_days is None else retention_days
+        os.makedirs(self.directory, exist_ok=True)
+
+    def segment_paths(self) -> List[str]:
+        """Return segment directories, oldest first."""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and not name.endswith(".tmp")
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _new_segment_path(self) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{timestamp}")
+
+    def _write_segment(self, path: str, metadata: List[Dict[str, Any]], embeddings: np.ndarray):
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, EMBEDDINGS_FILE), embeddings.astype(np.float32, copy=False))
+        with open(os.path.join(tmp_path, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def append(self, articles: List[Dict[str, Any]]) -> Optional[str]:
+        """Write articles that have an embedding as a new segment and return its path."""
+        articles = [article for article in articles if article.get("embedding")]
+        if not articles:
+            return None
+
+        ingested_at = time.time()
+        metadata = []
+        for article in articles:
+            row = {key: value for key, value in article.items() if key not in ("embedding", "raw_content")}
+            row["ingested_at"] = ingested_at
+            metadata.append(row)
+        embeddings = np.asarray([article["embedding"] for article in articles], dtype=np.float32)
+
+        path = self._new_segment_path()
+        self._write_segment(path, metadata, embeddings)
+
+        if len(self.segment_paths()) > self.max_segments:
+            path = self.compact()
+        return path
+
+    def iter_segments(self, mmap: bool = True) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """Yield (metadata rows, embedding matrix) per segment, memory-mapping the matrices."""
+        for path in self.segment_paths():
+            with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+            yield metadata, embeddings
+
+    def load(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Return the newest version of every article and their embeddings as one matrix.
+
+        After compaction there is a single segment, which is returned memory-mapped without a copy.
+        """
+        segments = list(self.iter_segments())
+        if not segments:
+            return [], np.empty((0, config.vector_dimension), dtype=np.float32)
+        if len(segments) == 1:
+            return segments[0]
+
+        latest: Dict[str, Tuple[int, int]] = {}
+        for segment_index, (metadata, _) in enumerate(segments):
+            for row_index, row in enumerate(metadata):
+                latest[row["id"]] = (segment_index, row_index)
+        metadata = [segments[s][0][r] for s, r in latest.values()]
+        embeddings = np.stack([segments[s][1][r] for s, r in latest.values()])
+        return metadata, embeddings
+
+    def compact(self) -> Optional[str]:
+        """Merge all segments into one, deduplicating by id and applying retention.
+
+        Returns the path of the compacted segment, or None if there was nothing to compact.
+        """
+        paths = self.segment_paths()
+        if not paths or (len(paths) == 1 and not self.retention_days):
+            return None
+
+        metadata, embeddings = self.load()
+        if self.retention_days:
+            cutoff = time.time() - self.retention_days * 86400
+            keep = [i for i, row in enumerate(metadata) if row.get("ingested_at", 0) >= cutoff]
+            metadata = [metadata[i] for i in keep]
+            embeddings = embeddings[keep] if keep else np.empty((0, embeddings.shape[1]), dtype=np.float32)
+        embeddings = np.array(embeddings, dtype=np.float32)
+
+        # The compacted segment sorts after the ones it replaces, so if removing them is
+        # interrupted, load() still prefers the compacted rows
+        compacted_path = self._new_segment_path()
+        self._write_segment(compacted_path, metadata, embeddings)
+        for path in paths:
+            shutil.rmtree(path)
+        return compacted_path
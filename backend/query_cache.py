@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import config
+
+
+def normalize_query(query: str) -> str:
+    """Casefold a query and collapse its whitespace so trivially different spellings share an entry."""
+    return " ".join(query.casefold().split())
+
+
+class QueryCache:
+    """Two-level cache in front of the query embedding call and the vector search.
+
+    The first level maps a normalized query string to its embedding. The second
+    maps a query embedding, ``top_k`` and filter to the search results. Result
+    entries remember the index generation they were computed at and are dropped
+    once ``upsert_articles`` or ``delete_article`` has changed the index. With a
+    ``similarity_threshold`` below 1, a result lookup that misses exactly falls
+    back to the cached query embedding with the highest cosine similarity above
+    the threshold.
+    """
+
+    def __init__(
+        self,
+        max_embeddings: Optional[int] = None,
+        max_results: Optional[int] = None,
+        ttl: Optional[float] = None,
+        similarity_threshold: Optional[float] = None
+    ):
+        self.max_embeddings = max_embeddings or config.query_embedding_cache_size
+        self.max_results = max_results or config.query_result_cache_size
+        self.ttl = ttl if ttl is not None else config.query_result_cache_ttl
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else config.query_result_similarity_threshold
+        )
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._results: "OrderedDict[Tuple, Tuple[np.ndarray, Any, List[Dict[str, Any]], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "embedding_hits": 0,
+            "embedding_misses": 0,
+            "result_hits": 0,
+            "result_near_hits": 0,
+            "result_misses": 0
+        }
+
+    def get_embedding(self, query: str) -> Optional[List[float]]:
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is None:
+                self._counters["embedding_misses"] += 1
+                return None
+            self._embeddings.move_to_end(key)
+            self._counters["embedding_hits"] += 1
+            return embedding
+
+    def put_embedding(self, query: str, embedding: List[float]):
+        if not embedding:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._embeddings[key] = embedding
+            self._embeddings.move_to_end(key)
+            while len(self._embeddings) > self.max_embeddings:
+                self._embeddings.popitem(last=False)
+
+    @staticmethod
+    def _vector(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _result_key(vector: np.ndarray, top_k: int, filters: Any) -> Tuple:
+        return hashlib.blake2b(vector.tobytes(), digest_size=16).digest(), top_k, filters
+
+    def _nearest_locked(self, vector: np.ndarray, top_k: int, filters: Any) -> Optional[Tuple]:
+        keys = [key for key in self._results if key[1:] == (top_k, filters)]
+        if not keys:
+            return None
+        similarities = np.stack([self._results[key][0] for key in keys]) @ vector
+        best = int(np.argmax(similarities))
+        return keys[best] if similarities[best] >= self.similarity_threshold else None
+
+    def get_results(
+        self,
+        embedding: List[float],
+        top_k: int,
+        filters: Any,
+        generation: Any
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for this query, or None if they are missing or out of date."""
+        vector = self._vector(embedding)
+        key = self._result_key(vector, top_k, filters)
+        now = time.time()
+        with self._lock:
+            # Drop everything computed against an older index or past its TTL
+            stale = [
+                k for k, (_, entry_generation, _, expires_at) in self._results.items()
+                if entry_generation != generation or expires_at <= now
+            ]
+            for k in stale:
+                del self._results[k]
+
+            counter = "result_hits"
+            if key not in self._results and self.similarity_threshold < 1:
+                key = self._nearest_locked(vector, top_k, filters)
+                counter = "result_near_hits"
+            if key is None or key not in self._results:
+                self._counters["result_misses"] += 1
+                return None
+            self._results.move_to_end(key)
+            self._counters[counter] += 1
+            return [dict(article) for article in self._results[key][2]]
+
+    def put_results(
+        self,
+        embedding: List[float],
+        top_k: int,
+        filters: Any,
+        generation: Any,
+        results: List[Dict[str, Any]]
+    ):
+        vector = self._vector(embedding)
+        key = self._result_key(vector, top_k, filters)
+        with self._lock:
+            self._results[key] = (
+                vector,
+                generation,
+                [dict(article) for article in results],
+                time.time() + self.ttl
+            )
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and hit ratios for both levels."""
+        with self._lock:
+            counters = dict(self._counters)
+            embedding_entries = len(self._embeddings)
+            result_entries = len(self._results)
+        embedding_total = counters["embedding_hits"] + counters["embedding_misses"]
+        result_hits = counters["result_hits"] + counters["result_near_hits"]
+        result_total = result_hits + counters["result_misses"]
+        return {
+            **counters,
+            "embedding_hit_ratio": counters["embedding_hits"] / embedding_total if embedding_total else 0.0,
+            "result_hit_ratio": result_hits / result_total if result_total else 0.0,
+            "embedding_entries": embedding_entries,
+            "result_entries": result_entries
+        }
@@ -1,22 +1,135 @@
-from groq import Groq
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple, TYPE_CHECKING
 from config import config
+from clients import groq_client
+from llm_cache import LLMResponseCache, make_cache_key
+from stream_parser import InsightStreamParser
+from metrics import llm_request_seconds, llm_tokens_total
+import hashlib
 import json
 
+if TYPE_CHECKING:
+    from groq import Groq
+
+# Bump these when a prompt changes so cached responses for the old prompt are not reused
+ANALYSIS_PROMPT_VERSION = "1"
+SUMMARY_PROMPT_VERSION = "1"
+SUMMARY_BATCH_PROMPT_VERSION = "1"
+
+SUMMARY_FALLBACK = "Unable to generate summary."
+
+SUMMARY_SYSTEM_PROMPT = "You are a news summarizer providing concise summaries of technology and AI news."
+SUMMARY_TEMPERATURE = 0.5
+SUMMARY_MAX_TOKENS = 250
+SUMMARY_BATCH_INSTRUCTIONS = """Please provide a concise summary of each article focusing on the key points and implications.
+
+Respond with a JSON object that maps each article number to its summary, like {"1": "...", "2": "..."}"""
+
+ANALYSIS_SYSTEM_PROMPT = "You are a news analyst providing insights about technology and AI news."
+ANALYSIS_TEMPERATURE = 0.7
+ANALYSIS_MAX_TOKENS = 500
+EMPTY_INSIGHTS = {
+    "themes": [],
+    "insights": [],
+    "implications": [],
+    "related_areas": []
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text from its length."""
+    return int(len(text) / config.llm_chars_per_token) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to about ``max_tokens`` tokens, at the last sentence end if there is one in the second half.
+
+    News articles lead with their key points, so the head of the text is kept.
+    """
+    max_chars = int(max_tokens * config.llm_chars_per_token)
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    cut = max(head.rfind(". "), head.rfind("! "), head.rfind("? "))
+    if cut >= max_chars // 2:
+        return head[:cut + 1]
+    cut = head.rfind(" ")
+    return (head[:cut] if cut > 0 else head) + " ..."
+
+
 class NewsRecommender:
-    def __init__(self, groq_client: Optional[Groq] = None):
-        self.client = groq_client or Groq(api_key=config.groq_api_key)
+    def __init__(self, groq_client: Optional["Groq"] = None, cache: Optional[LLMResponseCache] = None):
+        self._client = groq_client
+        if cache is None and config.llm_cache_enabled:
+            cache = LLMResponseCache()
+        self.cache = cache
 
-    def analyze_articles(self, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze a set of articles using Groq to generate insights."""
-        try:
-            # Prepare the prompt
-            articles_text = "\n\n".join([
-                f"Title: {article['title']}"
-                for article in articles
-            ])
-            
-            prompt = f"""Analyze these news articles and provide insights:
+    @property
+    def client(self) -> "Groq":
+        """The Groq client, defaulting to the shared one on first use."""
+        if self._client is None:
+            self._client = groq_client()
+        return self._client
+
+    @client.setter
+    def client(self, client: "Groq"):
+        self._client = client
+
+    @staticmethod
+    def _cache_key(system_prompt: str, prompt: str, temperature: float, max_tokens: int, prompt_version: str) -> str:
+        return make_cache_key(
+            model=config.llm_model,
+            prompt_version=prompt_version,
+            prompt_hash=hashlib.sha256(f"{system_prompt}\n{prompt}".encode("utf-8")).hexdigest(),
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+
+    @staticmethod
+    def _record_usage(usage: Any, operation: str):
+        llm_tokens_total.inc(getattr(usage, "prompt_tokens", 0) or 0, operation=operation, kind="prompt")
+        llm_tokens_total.inc(getattr(usage, "completion_tokens", 0) or 0, operation=operation, kind="completion")
+
+    def _complete(
+        self,
+        system_prompt: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        prompt_version: str,
+        operation: str
+    ) -> str:
+        """Get a chat completion from Groq, served from the response cache when possible."""
+        def create() -> str:
+            with llm_request_seconds.time(operation=operation):
+                completion = self.client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=config.llm_model,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            usage = getattr(completion, "usage", None)
+            if usage is not None:
+                self._record_usage(usage, operation)
+            return completion.choices[0].message.content
+
+        if self.cache is None:
+            return create()
+
+        key = self._cache_key(system_prompt, prompt, temperature, max_tokens, prompt_version)
+        return self.cache.get_or_compute(key, create)
+
+    @staticmethod
+    def _analysis_prompt(articles: List[Dict[str, Any]]) -> str:
+        articles_text = "\n\n".join([
+            f"Title: {article['title']}"
+            for article in articles
+        ])
+
+        return f"""Analyze these news articles and provide insights:
 
 {articles_text}
 
@@ -28,70 +141,196 @@ Please provide:
 
 Format the response as a JSON with these keys: themes, insights, implications, related_areas"""
 
-            # Get completion from Groq
-            completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a news analyst providing insights about technology and AI news."},
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama3-70b-8192",
-                temperature=0.7,
-                max_tokens=500
-            )
-
-            # Parse and return the analysis
-            response_text = completion.choices[0].message.content
-            
-            # Try to extract JSON from the response if it's wrapped in markdown code blocks
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    pass
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].split("```")[0].strip()
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    pass
-            
-            # If we couldn't extract JSON, try to parse the entire response
+    @staticmethod
+    def parse_analysis(response_text: str) -> Any:
+        """Parse the JSON insights out of a completion, or return the raw text if there are none."""
+        # Try to extract JSON from the response if it's wrapped in markdown code blocks
+        if "```json" in response_text:
+            json_str = response_text.split("```json")[1].split("```")[0].strip()
+            try:
+                return json.loads(json_str)
+            except json.JSONDecodeError:
+                pass
+        elif "```" in response_text:
+            json_str = response_text.split("```")[1].split("```")[0].strip()
             try:
-                return json.loads(response_text)
+                return json.loads(json_str)
             except json.JSONDecodeError:
-                # If all parsing attempts fail, return the raw text
-                return response_text
+                pass
+
+        # If we couldn't extract JSON, try to parse the entire response
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # If all parsing attempts fail, return the raw text
+            return response_text
+
+    def analyze_articles(self, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Analyze a set of articles using Groq to generate insights."""
+        try:
+            # Get completion from Groq
+            response_text = self._complete(
+                system_prompt=ANALYSIS_SYSTEM_PROMPT,
+                prompt=self._analysis_prompt(articles),
+                temperature=ANALYSIS_TEMPERATURE,
+                max_tokens=ANALYSIS_MAX_TOKENS,
+                prompt_version=ANALYSIS_PROMPT_VERSION,
+                operation="analysis"
+            )
+            return self.parse_analysis(response_text)
         except Exception as e:
             print(f"Error analyzing articles: {str(e)}")
-            return {
-                "themes": [],
-                "insights": [],
-                "implications": [],
-                "related_areas": []
-            }
+            return dict(EMPTY_INSIGHTS)
 
-    def generate_summary(self, article: Dict[str, Any]) -> str:
-        """Generate a summary of a single article using Groq."""
+    def stream_analysis(self, articles: List[Dict[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        """Analyze articles like ``analyze_articles``, yielding each insight as soon as it is generated.
+
+        Yields ``(key, item)`` for every completed item of the JSON response, for
+        example ``("themes", "AI regulation")``, then ``("done", insights)`` with
+        the parsed response. The completion is streamed from Groq and parsed
+        incrementally; a cached response is replayed through the same parser.
+        """
+        prompt = self._analysis_prompt(articles)
+        key = self._cache_key(
+            ANALYSIS_SYSTEM_PROMPT, prompt, ANALYSIS_TEMPERATURE, ANALYSIS_MAX_TOKENS, ANALYSIS_PROMPT_VERSION
+        )
+        parser = InsightStreamParser()
         try:
-            prompt = f"""Summarize this news article:
+            cached = self.cache.get(key, record_stats=True) if self.cache is not None else None
+            if cached is not None:
+                yield from parser.feed(cached)
+                yield "done", self.parse_analysis(cached)
+                return
+
+            pieces = []
+            with llm_request_seconds.time(operation="analysis_stream"):
+                stream = self.client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=config.llm_model,
+                    temperature=ANALYSIS_TEMPERATURE,
+                    max_tokens=ANALYSIS_MAX_TOKENS,
+                    stream=True
+                )
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        pieces.append(delta)
+                        yield from parser.feed(delta)
+                    # Groq reports token usage on the last chunk
+                    usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                    if usage is not None:
+                        self._record_usage(usage, "analysis_stream")
+            response_text = "".join(pieces)
+            if self.cache is not None and response_text:
+                self.cache.set(key, response_text)
+            yield "done", self.parse_analysis(response_text)
+        except Exception as e:
+            print(f"Error streaming article analysis: {str(e)}")
+            yield "done", dict(EMPTY_INSIGHTS)
+
+    @staticmethod
+    def _summary_prompt(article: Dict[str, Any]) -> str:
+        content = truncate_to_tokens(article['content'], config.summary_max_content_tokens)
+        return f"""Summarize this news article:
 
 Title: {article['title']}
-Content: {article['content']}
+Content: {content}
 
 Please provide a concise summary focusing on the key points and implications."""
 
-            completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a news summarizer providing concise summaries of technology and AI news."},
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama3-70b-8192",
-                temperature=0.5,
-                max_tokens=250
+    def generate_summary(self, article: Dict[str, Any]) -> str:
+        """Generate a summary of a single article using Groq."""
+        try:
+            return self._complete(
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                prompt=self._summary_prompt(article),
+                temperature=SUMMARY_TEMPERATURE,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                prompt_version=SUMMARY_PROMPT_VERSION,
+                operation="summary"
             )
-
-            return completion.choices[0].message.content
         except Exception as e:
             print(f"Error generating summary: {str(e)}")
-            return "Unable to generate summary."
+            return SUMMARY_FALLBACK
+
+    @staticmethod
+    def pack_summary_batches(articles: List[Dict[str, Any]]) -> List[List[Tuple[int, str]]]:
+        """Group articles into summary prompts that fit the token budget.
+
+        Returns the batches as lists of ``(index, section)``, where the section
+        is the article's part of the prompt with its content cut to fit. The
+        budget leaves room for the instructions and for ``summary_tokens_per_article``
+        completion tokens per article, so no prompt can overflow the context window.
+        """
+        max_articles = config.summary_batch_max_articles
+        budget = min(
+            config.summary_batch_prompt_tokens,
+            config.llm_context_tokens
+            - max_articles * config.summary_tokens_per_article
+            - estimate_tokens(SUMMARY_SYSTEM_PROMPT + SUMMARY_BATCH_INSTRUCTIONS)
+        )
+        batches: List[List[Tuple[int, str]]] = []
+        batch: List[Tuple[int, str]] = []
+        used = 0
+        for index, article in enumerate(articles):
+            title = f"Title: {article['title']}\nContent: "
+            # The header takes "[10] " at most; an article alone always fits the budget
+            content_budget = min(config.summary_max_content_tokens, budget - estimate_tokens(title) - 2)
+            section = title + truncate_to_tokens(article["content"], max(content_budget, 0))
+            cost = estimate_tokens(section) + 2
+            if batch and (used + cost > budget or len(batch) >= max_articles):
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append((index, section))
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _summarize_batch(self, batch: List[Tuple[int, str]]) -> Dict[int, str]:
+        """Summarize a packed batch in one completion, returning the summaries it contained by index."""
+        sections = "\n\n".join(f"[{number}] {section}" for number, (_, section) in enumerate(batch, 1))
+        try:
+            response_text = self._complete(
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                prompt=f"Summarize each of these news articles:\n\n{sections}\n\n{SUMMARY_BATCH_INSTRUCTIONS}",
+                temperature=SUMMARY_TEMPERATURE,
+                max_tokens=config.summary_tokens_per_article * len(batch),
+                prompt_version=SUMMARY_BATCH_PROMPT_VERSION,
+                operation="summary_batch"
+            )
+        except Exception as e:
+            print(f"Error generating batch summary: {str(e)}")
+            return {}
+        parsed = self.parse_analysis(response_text)
+        if not isinstance(parsed, dict):
+            return {}
+        summaries = {}
+        for number, (index, _) in enumerate(batch, 1):
+            summary = parsed.get(str(number))
+            if isinstance(summary, str) and summary.strip():
+                summaries[index] = summary.strip()
+        return summaries
+
+    def summarize_many(self, articles: List[Dict[str, Any]]) -> List[str]:
+        """Summarize articles several per completion, in the order given.
+
+        Articles are packed into prompts by ``pack_summary_batches`` and the
+        batches run concurrently on ``summary_workers`` threads. An article
+        missing from its batch's response is summarized on its own, and
+        ``SUMMARY_FALLBACK`` stands in for summaries that still failed.
+        """
+        if not articles:
+            return []
+        batches = self.pack_summary_batches(articles)
+        summaries: Dict[int, str] = {}
+        with ThreadPoolExecutor(max_workers=config.summary_workers) as executor:
+            for batch_summaries in executor.map(self._summarize_batch, batches):
+                summaries.update(batch_summaries)
+            missing = [index for index in range(len(articles)) if index not in summaries]
+            for index, summary in zip(missing, executor.map(self.generate_summary, [articles[i] for i in missing])):
+                summaries[index] = summary
+        return [summaries[index] for index in range(len(articles))]
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+
+def parse_published(value: Optional[str]) -> Optional[float]:
+    """Parse an RSS (RFC 822) or ISO 8601 date into a UTC epoch timestamp, or None."""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Metadata restrictions applied inside the index during a similarity search."""
+    source: Optional[str] = None
+    category: Optional[str] = None
+    published_after: Optional[float] = None  # Inclusive epoch seconds
+    published_before: Optional[float] = None  # Inclusive epoch seconds
+
+    def is_empty(self) -> bool:
+        return (
+            self.source is None
+            and self.category is None
+            and self.published_after is None
+            and self.published_before is None
+        )
+
+    def to_pinecone(self) -> Optional[Dict[str, Any]]:
+        """Translate the filter into a Pinecone metadata filter expression."""
+        conditions: Dict[str, Any] = {}
+        if self.source is not None:
+            conditions["source"] = {"$eq": self.source}
+        if self.category is not None:
+            conditions["categories"] = {"$in": [self.category]}
+        published: Dict[str, float] = {}
+        if self.published_after is not None:
+            published["$gte"] = self.published_after
+        if self.published_before is not None:
+            published["$lte"] = self.published_before
+        if published:
+            conditions["published_ts"] = published
+        return conditions or None
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Check a single article's metadata against the filter."""
+        if self.source is not None and metadata.get("source") != self.source:
+            return False
+        if self.category is not None and self.category not in (metadata.get("categories") or []):
+            return False
+        if self.published_after is not None or self.published_before is not None:
+            published_ts = metadata.get("published_ts")
+            if published_ts is None:
+                return False
+            if self.published_after is not None and published_ts < self.published_after:
+                return False
+            if self.published_before is not None and published_ts > self.published_before:
+                return False
+        return True
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import config
+
+FINGERPRINT_FIELDS = ("title", "content", "link", "published", "source", "categories")
+
+
+def article_fingerprint(article: Dict[str, Any]) -> str:
+    """Return a sha256 fingerprint of the article fields that end up in the index.
+
+    A ``published`` time filled in at fetch time, marked by ``published_defaulted``,
+    changes on every run and is left out.
+    """
+    defaulted = article.get("published_defaulted")
+    payload = json.dumps(
+        [None if defaulted and field == "published" else article.get(field) for field in FINGERPRINT_FIELDS],
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SeenArticleIndex:
+    """Persistent record of ingested articles keyed by id and content fingerprint."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.seen_articles_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_articles (
+                id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_updated REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def classify(
+        self, articles: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split articles into (new, updated, unchanged) against the stored fingerprints."""
+        new, updated, unchanged = [], [], []
+        with self._lock:
+            for article in articles:
+                row = self._conn.execute(
+                    "SELECT fingerprint FROM seen_articles WHERE id = ?", (article["id"],)
+                ).fetchone()
+                if row is None:
+                    new.append(article)
+                elif row[0] != article_fingerprint(article):
+                    updated.append(article)
+                else:
+                    unchanged.append(article)
+        return new, updated, unchanged
+
+    def mark_seen(self, articles: List[Dict[str, Any]]):
+        """Record the current fingerprint of each article."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO seen_articles (id, fingerprint, first_seen, last_updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                "last_updated = excluded.last_updated",
+                [(article["id"], article_fingerprint(article), now, now) for article in articles]
+            )
+            self._conn.commit()
+
+    def forget(self, article_id: str):
+        """Drop an article so the next run treats it as new."""
+        with self._lock:
+            self._conn.execute("DELETE FROM seen_articles WHERE id = ?", (article_id,))
+            self._conn.commit()
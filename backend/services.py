@@ -0,0 +1,229 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
+
+from config import config
+from embeddings import EmbeddingGenerator
+from recommender import NewsRecommender, SUMMARY_FALLBACK
+from article_store import ArticleStore
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from search_filters import SearchFilter
+from query_cache import QueryCache
+from dedup import collapse_clusters
+from personalization import UserProfileStore, FeedRanker
+
+
+def _close_quietly(iterator: Iterator):
+    try:
+        iterator.close()
+    except ValueError:
+        pass  # Still running on another thread
+
+
+class AsyncNewsService:
+    """Async facade over the blocking Cohere, vector store, Groq and SQLite clients.
+
+    Blocking calls run on a dedicated thread pool so they never stall the event
+    loop or compete with Starlette's own thread pool. Query embeddings and
+    vector search results go through a ``QueryCache``. Personalized feeds are
+    ranked by a ``FeedRanker`` from the interest vectors in ``UserProfileStore``.
+    """
+
+    def __init__(
+        self,
+        embedding_generator: EmbeddingGenerator,
+        vector_store,
+        recommender: NewsRecommender,
+        article_store: ArticleStore,
+        lexical_index: BM25Index,
+        query_cache: Optional[QueryCache] = None,
+        user_profiles: Optional[UserProfileStore] = None,
+        feed_ranker: Optional[FeedRanker] = None,
+        max_workers: Optional[int] = None
+    ):
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        self.recommender = recommender
+        self.article_store = article_store
+        self.lexical_index = lexical_index
+        if query_cache is None and config.query_cache_enabled:
+            query_cache = QueryCache()
+        self.query_cache = query_cache
+        self.user_profiles = user_profiles or UserProfileStore()
+        self.feed_ranker = feed_ranker or FeedRanker(article_store)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.service_workers,
+            thread_name_prefix="news-service"
+        )
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call on the service thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_query_embedding(self, query: str) -> List[float]:
+        if self.query_cache is None:
+            return await self.run(self.embedding_generator.get_query_embedding, query)
+        embedding = self.query_cache.get_embedding(query)
+        if embedding is None:
+            embedding = await self.run(self.embedding_generator.get_query_embedding, query)
+            self.query_cache.put_embedding(query, embedding)
+        return embedding
+
+    async def search_similar(
+        self,
+        query_embedding: List[float],
+        top_k: int = None,
+        filters: Optional[SearchFilter] = None
+    ) -> List[Dict[str, Any]]:
+        if self.query_cache is None:
+            return await self.run(self.vector_store.search_similar, query_embedding, top_k, filters)
+        top_k = top_k or config.top_k_results
+        if filters is not None and filters.is_empty():
+            filters = None
+        # Read the generation before searching so results racing with an upsert are never cached as fresh
+        generation = self.vector_store.generation
+        results = self.query_cache.get_results(query_embedding, top_k, filters, generation)
+        if results is None:
+            results = await self.run(self.vector_store.search_similar, query_embedding, top_k, filters)
+            if results:
+                self.query_cache.put_results(query_embedding, top_k, filters, generation, results)
+        return results
+
+    async def search_articles(
+        self,
+        query: str,
+        top_k: int = None,
+        mode: str = "auto",
+        filters: Optional[SearchFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """Search articles for a text query.
+
+        ``mode`` is "lexical" (BM25 only, no embedding call), "vector", "hybrid"
+        (BM25 and vector candidates fused with reciprocal rank fusion) or "auto",
+        which takes the lexical fast path for short queries that have BM25
+        matches and runs a hybrid search otherwise. ``filters`` are applied
+        inside both indexes, so every mode returns up to ``top_k`` matching
+        articles. Near-duplicates are collapsed to the best-ranked article of
+        each cluster, over-fetching by ``dedup_overfetch`` to fill ``top_k``.
+        """
+        top_k = top_k or config.top_k_results
+        limit = top_k * config.dedup_overfetch if config.dedup_enabled else top_k
+        candidates = max(limit, config.hybrid_candidates)
+        lexical_hits = []
+        if mode != "vector":
+            lexical_hits = await self.run(self.lexical_index.search, query, candidates, filters)
+
+        if mode == "auto":
+            short_query = len(tokenize(query)) <= config.lexical_fast_path_max_terms
+            mode = "lexical" if short_query and lexical_hits else "hybrid"
+
+        if mode == "lexical":
+            hits = lexical_hits[:limit]
+            articles = await self.run(self.article_store.get_many, [doc_id for doc_id, _ in hits])
+            scores = dict(hits)
+            return collapse_clusters([{**article, "score": scores[article["id"]]} for article in articles], top_k)
+
+        query_embedding = await self.get_query_embedding(query)
+        if not query_embedding:
+            return []
+        vector_hits = await self.search_similar(
+            query_embedding, candidates if mode == "hybrid" else limit, filters
+        )
+        if mode == "vector" or not lexical_hits:
+            return collapse_clusters(vector_hits, top_k)
+
+        fused = reciprocal_rank_fusion([
+            [doc_id for doc_id, _ in lexical_hits],
+            [article["id"] for article in vector_hits]
+        ])[:limit]
+        by_id = {article["id"]: article for article in vector_hits}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        for article in await self.run(self.article_store.get_many, missing):
+            by_id[article["id"]] = article
+        return collapse_clusters(
+            [{**by_id[doc_id], "score": score} for doc_id, score in fused if doc_id in by_id], top_k
+        )
+
+    async def analyze_articles(self, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self.run(self.recommender.analyze_articles, articles)
+
+    async def stream_insights(self, articles: List[Dict[str, Any]]) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield the events of ``NewsRecommender.stream_analysis``, reading the stream on the thread pool."""
+        events = self.recommender.stream_analysis(articles)
+        finished = object()
+        try:
+            while True:
+                event = await self.run(next, events, finished)
+                if event is finished:
+                    return
+                yield event
+        finally:
+            # Stops reading the Groq stream when the client goes away. If a read is
+            # still running, the generator is closed once it is garbage collected.
+            _close_quietly(events)
+
+    async def get_article(self, article_id: str, include_embedding: bool = False) -> Optional[Dict[str, Any]]:
+        return await self.run(self.article_store.get, article_id, include_embedding)
+
+    async def get_articles(self, article_ids: List[str]) -> List[Dict[str, Any]]:
+        return await self.run(self.article_store.get_many, article_ids)
+
+    async def list_recent_articles(self, limit: int = None) -> List[Dict[str, Any]]:
+        return await self.run(self.article_store.list_recent, limit)
+
+    async def list_articles_page(self, limit: int, before: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        return await self.run(self.article_store.list_page, limit, before)
+
+    async def articles_version(self) -> Tuple[int]:
+        return (await self.run(self.article_store.version),)
+
+    async def search_version(self) -> Tuple[int, ...]:
+        """Return a value that changes whenever the articles or the indexes searches read from change."""
+        return (*await self.articles_version(), self.vector_store.version(), self.lexical_index.generation)
+
+    async def get_article_with_summary(self, article_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return an article and its summary, generating and storing the summary on a miss."""
+        article, summary = await asyncio.gather(
+            self.get_article(article_id),
+            self.run(self.article_store.get_summary, article_id)
+        )
+        if article is None:
+            return None, None
+        if summary is None:
+            summary = await self.run(self.recommender.generate_summary, article)
+            if summary != SUMMARY_FALLBACK:
+                await self.run(self.article_store.set_summary, article_id, summary)
+        return article, summary
+
+    async def get_user_id(self, username: str) -> Optional[int]:
+        return await self.run(self.user_profiles.get_user_id, username)
+
+    async def record_event(self, user_id: int, article_id: str, kind: str) -> bool:
+        """Record a view or click, reusing the stored embedding of the article; False if it has none."""
+        embeddings = await self.run(self.article_store.get_embeddings, [article_id])
+        if article_id not in embeddings:
+            return False
+        return await self.run(self.user_profiles.record_event, user_id, article_id, kind, embeddings[article_id])
+
+    async def get_feed(
+        self,
+        user_id: int,
+        top_k: int = None,
+        diversity: Optional[float] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Return the user's personalized feed and whether it was personalized.
+
+        Ranking runs over in-memory embeddings, with no embedding or vector store call.
+        """
+        interest, seen = await asyncio.gather(
+            self.run(self.user_profiles.interest, user_id),
+            self.run(self.user_profiles.seen_ids, user_id)
+        )
+        articles = await self.run(self.feed_ranker.rank, interest, top_k, seen, diversity)
+        return articles, interest is not None
+
+    def shutdown(self):
+        """Stop the executor, letting running calls finish."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class InsightStreamParser:
+    """Incremental parser for a JSON object of lists streamed a few characters at a time.
+
+    ``feed`` takes the next piece of the completion and returns ``(key, item)``
+    for every list item of the top-level object that completed in it, such as
+    ``("themes", "AI regulation")``. Values that are not lists are returned
+    whole as ``(key, value)``. Text before the opening brace, like a markdown
+    code fence, and anything after the closing brace are ignored. Each
+    character is scanned once, so parsing a whole response is linear in its
+    length.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = 0
+        self._stack: List[str] = []
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._element_start: Optional[int] = None
+        self._element_depth = 0
+        self._element_scalar = False
+
+    def _at_value(self) -> bool:
+        """Whether the scanner is where an item of interest can start."""
+        if self._element_start is not None:
+            return False
+        return self._stack == ["{", "["] or (self._stack == ["{"] and not self._expect_key)
+
+    def _start_element(self, index: int, scalar: bool = False):
+        self._element_start = index
+        self._element_depth = len(self._stack)
+        self._element_scalar = scalar
+
+    def _end_element(self, end: int, events: List[Tuple[str, Any]]):
+        text = self._buffer[self._element_start:end].strip()
+        self._element_start = None
+        self._element_scalar = False
+        try:
+            events.append((self._key, json.loads(text)))
+        except json.JSONDecodeError:
+            pass
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        self._buffer += text
+        while self._position < len(self._buffer) and not self._finished:
+            index = self._position
+            char = self._buffer[index]
+            self._position += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append(char)
+                    self._expect_key = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._stack == ["{"] and self._expect_key:
+                        self._key = json.loads(self._buffer[self._string_start:index + 1])
+                    elif self._element_start == self._string_start and self._element_depth == len(self._stack):
+                        self._end_element(index + 1, events)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                if self._at_value():
+                    self._start_element(index)
+            elif char in "{[":
+                # A list value is reported item by item, anything else nested as a whole
+                if self._at_value() and not (self._stack == ["{"] and char == "["):
+                    self._start_element(index)
+                self._stack.append(char)
+            elif char in "}]":
+                if self._element_scalar and self._element_depth == len(self._stack):
+                    self._end_element(index, events)
+                if self._stack:
+                    self._stack.pop()
+                if self._element_start is not None and self._element_depth == len(self._stack):
+                    self._end_element(index + 1, events)
+                if not self._stack:
+                    self._finished = True
+            elif char == ",":
+                if self._element_scalar and self._element_depth == len(self._stack):
+                    self._end_element(index, events)
+                if self._stack == ["{"]:
+                    self._expect_key = True
+            elif char == ":":
+                if self._stack == ["{"]:
+                    self._expect_key = False
+            elif not char.isspace() and self._at_value():
+                self._start_element(index, scalar=True)
+        return events
@@ -1,17 +1,83 @@
-from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Any, Optional
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 from config import config
+from clients import pinecone_client
+from article_store import ArticleStore
+from search_filters import SearchFilter
+from metrics import vector_upsert_seconds, vector_query_seconds
+
+if TYPE_CHECKING:
+    from pinecone import Pinecone
+
+
+@dataclass
+class UpsertResult:
+    """Ids of the articles an upsert stored and of those it failed to store.
+
+    True only when nothing failed, so callers can keep testing it as a flag.
+    """
+    upserted_ids: List[str] = field(default_factory=list)
+    failed_ids: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return not self.failed_ids
 
 class VectorStore:
-    def __init__(self, pinecone_client: Optional[Pinecone] = None):
-        self.pinecone = pinecone_client or Pinecone(api_key=config.pinecone_api_key)
+    """Pinecone-backed vector store.
+
+    Nothing goes over the network on construction: the index is looked up, and
+    created if missing, on first use or by ``warmup``. Unless
+    ``pinecone_store_content`` is set, the index holds only vectors and the
+    small fields used by filters, and search results are completed from
+    ``article_store``.
+    """
+
+    def __init__(self, pinecone_client: Optional["Pinecone"] = None, article_store: Optional[ArticleStore] = None):
+        self._pinecone = pinecone_client
+        if config.pinecone_store_content:
+            article_store = None
+        elif article_store is None:
+            article_store = ArticleStore()
+        self.article_store = article_store
         self.index_name = config.pinecone_index_name
-        self._ensure_index()
+        self.batch_size = config.pinecone_upsert_batch_size
+        self.max_request_bytes = config.pinecone_upsert_max_bytes
+        self.max_concurrency = config.pinecone_upsert_concurrency
+        self.max_retries = config.pinecone_upsert_max_retries
+        self.retry_backoff = config.pinecone_upsert_retry_backoff
+        self.generation = 0  # Bumped on every change to the index, used to invalidate cached results
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def pinecone(self) -> "Pinecone":
+        if self._pinecone is None:
+            self._pinecone = pinecone_client()
+        return self._pinecone
+
+    @property
+    def index(self):
+        """The Pinecone index handle, resolved on first use."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = self._ensure_index()
+        return self._index
+
+    def warmup(self):
+        """Resolve the index ahead of the first request."""
+        return self.index
 
     def _ensure_index(self):
         """Ensure the Pinecone index exists, create if it doesn't."""
         # Check if index exists, create if it doesn't
         if self.index_name not in self.pinecone.list_indexes().names():
+            from pinecone import ServerlessSpec
             # Create a new index with the correct dimension
             self.pinecone.create_index(
                 name=self.index_name,
@@ -21,45 +87,107 @@ class VectorStore:
             )
             print(f"Created new index '{self.index_name}' with dimension {config.vector_dimension}")
         
-        self.index = self.pinecone.Index(self.index_name)
+        return self.pinecone.Index(self.index_name)
 
-    def upsert_articles(self, articles: List[Dict[str, Any]]) -> bool:
-        """Upsert articles to the vector store."""
-        try:
-            vectors = []
-            for article in articles:
-                if "embedding" not in article:
-                    continue
-                    
-                vector = {
-                    "id": article["id"],
-                    "values": article["embedding"],
-                    "metadata": {
-                        "title": article["title"],
-                        "content": article["content"],
-                        "link": article["link"],
-                        "published": article["published"],
-                        "source": article["source"],
-                        "categories": article["categories"]
-                    }
-                }
-                vectors.append(vector)
+    def _vector(self, article: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Pinecone record of an article.
 
-            if vectors:
-                self.index.upsert(vectors=vectors)
-            return True
+        Only the fields used by filters and deduplication are stored unless
+        ``pinecone_store_content`` is set; the rest is read back from the
+        article store when searching.
+        """
+        metadata = {"source": article["source"], "categories": article["categories"]}
+        if self.article_store is None:
+            metadata.update({
+                "title": article["title"],
+                "content": article["content"],
+                "link": article["link"],
+                "published": article["published"]
+            })
+        for key in ("published_ts", "cluster_id"):
+            if article.get(key) is not None:
+                metadata[key] = article[key]
+        return {"id": article["id"], "values": article["embedding"], "metadata": metadata}
+
+    def _chunks(self, vectors: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Split vectors into requests within the record count and payload size limits."""
+        chunks: List[List[Dict[str, Any]]] = []
+        chunk: List[Dict[str, Any]] = []
+        chunk_bytes = 0
+        for vector in vectors:
+            size = len(json.dumps(vector, separators=(",", ":")))
+            if chunk and (len(chunk) >= self.batch_size or chunk_bytes + size > self.max_request_bytes):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append(vector)
+            chunk_bytes += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _upsert_chunk(self, chunk: List[Dict[str, Any]]) -> bool:
+        """Upsert one request's worth of vectors, retrying with exponential backoff."""
+        for attempt in range(self.max_retries):
+            try:
+                with vector_upsert_seconds.time(backend="pinecone"):
+                    self.index.upsert(vectors=chunk)
+                return True
+            except Exception as e:
+                print(f"Error upserting chunk of {len(chunk)} (attempt {attempt + 1}/{self.max_retries}): {str(e)}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_backoff * 2 ** attempt + random.uniform(0, self.retry_backoff))
+        return False
+
+    def upsert_articles(self, articles: List[Dict[str, Any]]) -> UpsertResult:
+        """Upsert articles to the vector store in concurrent chunks.
+
+        Articles without an embedding are skipped. A chunk that keeps failing
+        does not stop the others; its ids are reported in ``failed_ids``.
+        """
+        result = UpsertResult()
+        try:
+            vectors = [self._vector(article) for article in articles if "embedding" in article]
         except Exception as e:
             print(f"Error upserting articles: {str(e)}")
-            return False
+            result.failed_ids = [article["id"] for article in articles if "embedding" in article]
+            return result
+        chunks = self._chunks(vectors)
+        if not chunks:
+            return result
+        if len(chunks) == 1:
+            outcomes = [self._upsert_chunk(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+                outcomes = list(executor.map(self._upsert_chunk, chunks))
+
+        for chunk, ok in zip(chunks, outcomes):
+            ids = [vector["id"] for vector in chunk]
+            (result.upserted_ids if ok else result.failed_ids).extend(ids)
+        if result.upserted_ids:
+            self.generation += 1
+        if result.failed_ids:
+            print(f"Failed to upsert {len(result.failed_ids)} of {len(vectors)} articles")
+        return result
 
-    def search_similar(self, query_embedding: List[float], top_k: int = None) -> List[Dict[str, Any]]:
-        """Search for similar articles using the query embedding."""
+    def version(self) -> int:
+        """Return a constant: the index is shared by every process and changes along with the article store."""
+        return 0
+
+    def search_similar(
+        self,
+        query_embedding: List[float],
+        top_k: int = None,
+        filters: Optional[SearchFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for similar articles using the query embedding, optionally restricted by metadata."""
         try:
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k or config.top_k_results,
-                include_metadata=True
-            )
+            with vector_query_seconds.time(backend="pinecone"):
+                results = self.index.query(
+                    vector=query_embedding,
+                    top_k=top_k or config.top_k_results,
+                    filter=filters.to_pinecone() if filters else None,
+                    include_metadata=True
+                )
             
             articles = []
             for match in results.matches:
@@ -69,18 +197,41 @@ class VectorStore:
                     **match.metadata
                 }
                 articles.append(article)
-            
+
+            if self.article_store is not None:
+                articles = self._hydrate(articles)
             return articles
         except Exception as e:
             print(f"Error searching similar articles: {str(e)}")
             return []
 
+    def _hydrate(self, articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in the fields left out of the index from the article store."""
+        stored = {article["id"]: article for article in self.article_store.get_many([a["id"] for a in articles])}
+        hydrated = []
+        for article in articles:
+            if article["id"] in stored:
+                hydrated.append({**stored[article["id"]], **article})
+            elif "title" in article:
+                # Upserted with its full metadata, before trimming or with pinecone_store_content
+                hydrated.append(article)
+            # Otherwise it was deleted from the article store: ingests write it before the index
+        return hydrated
+
     def delete_article(self, article_id: str) -> bool:
         """Delete an article from the vector store."""
         try:
             self.index.delete(ids=[article_id])
+            self.generation += 1
             return True
         except Exception as e:
             print(f"Error deleting article: {str(e)}")
             return False
 
+
+def create_vector_store(article_store: Optional[ArticleStore] = None):
+    """Create the vector store for the configured backend."""
+    if config.vector_backend == "local":
+        from local_vector_store import LocalVectorStore
+        return LocalVectorStore()
+    return VectorStore(article_store=article_store)
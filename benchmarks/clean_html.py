@@ -0,0 +1,73 @@
+"""Benchmark the streaming HTML cleaner against the original BeautifulSoup cleaner.
+
+Replays every ``raw_content`` in data/raw_news, checks that both cleaners
+produce identical output and prints the timings as JSON.
+
+    python benchmarks/clean_html.py [--repeat 3] [--workers 4]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from config import config  # noqa: E402
+from html_cleaner import clean_html, clean_html_many, clean_html_reference, clean_html_uncached  # noqa: E402
+
+
+def load_raw_contents():
+    contents = []
+    for path in sorted(glob.glob(os.path.join(config.raw_news_dir, "raw_news_*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            contents.extend(article.get("raw_content", "") for article in json.load(f))
+    return contents
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    contents = load_raw_contents()
+    mismatches = sum(clean_html_reference(c) != clean_html_uncached(c) for c in contents)
+
+    reference = best_of(args.repeat, lambda: [clean_html_reference(c) for c in contents])
+    streaming = best_of(args.repeat, lambda: [clean_html_uncached(c) for c in contents])
+    # Run the pool before the cached pass, while the cache is still empty
+    config.html_clean_parallel_threshold = 0
+    pooled = best_of(1, lambda: clean_html_many(contents * 10, workers=args.workers)) / 10
+    cached = best_of(args.repeat, lambda: [clean_html(c) for c in contents])
+
+    print(json.dumps({
+        "documents": len(contents),
+        "identical_output": mismatches == 0,
+        "mismatches": mismatches,
+        "seconds": {
+            "reference": reference,
+            "streaming": streaming,
+            "cached": cached,
+            "process_pool": pooled
+        },
+        "speedup": {
+            "streaming": reference / streaming,
+            "cached": reference / cached
+        }
+    }, indent=2))
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Deterministic offline stand-ins for the Cohere, Pinecone and Groq clients and the RSS feeds.
+
+Every fake takes a ``latency`` in seconds added to each call and an
+``error_rate`` between 0 and 1 of calls that raise, drawn from a seeded
+random generator so runs are reproducible.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+import httpx
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class FakeServiceError(Exception):
+    """Raised by a fake client to simulate an upstream failure."""
+
+
+class _Faults:
+    def __init__(self, latency: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> bool:
+        """Count a call and return whether it should fail."""
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def __call__(self, name: str):
+        fail = self.draw()
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeServiceError(f"Simulated {name} failure")
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+def hashed_embedding(text: str, dimension: int = 1024) -> List[float]:
+    """Embed text by feature-hashing its words, so texts sharing words get similar vectors."""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimension
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+class FakeCohereClient:
+    """Cohere client whose ``embed`` returns hashed bag-of-words embeddings."""
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.dimension = dimension
+        self.faults = _Faults(latency, error_rate, seed)
+
+    def embed(self, texts: List[str], model: str, input_type: str):
+        self.faults("embed")
+        return SimpleNamespace(embeddings=[hashed_embedding(text, self.dimension) for text in texts])
+
+
+def _matches_filter(metadata: Dict[str, Any], expression: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (expression or {}).items():
+        value = metadata.get(key)
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$in" and not (set(value) if isinstance(value, list) else {value}) & set(operand):
+                return False
+            if operator == "$gte" and (value is None or value < operand):
+                return False
+            if operator == "$lte" and (value is None or value > operand):
+                return False
+    return True
+
+
+class FakePineconeIndex:
+    """Exact cosine search over an in-memory dict, with Pinecone's upsert/query/delete API."""
+
+    def __init__(self, faults: _Faults):
+        self.faults = faults
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[Dict[str, Any]]):
+        self.faults("upsert")
+        with self._lock:
+            for vector in vectors:
+                values = np.asarray(vector["values"], dtype=np.float32)
+                self._vectors[vector["id"]] = values / (np.linalg.norm(values) or 1.0)
+                self._metadata[vector["id"]] = dict(vector.get("metadata", {}))
+        return SimpleNamespace(upserted_count=len(vectors))
+
+    def query(self, vector: List[float], top_k: int, filter: Optional[Dict[str, Any]] = None,
+              include_metadata: bool = False):
+        self.faults("query")
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            ids = [i for i in self._vectors if _matches_filter(self._metadata[i], filter)]
+            if not ids:
+                return SimpleNamespace(matches=[])
+            scores = np.stack([self._vectors[i] for i in ids]) @ query
+            best = np.argsort(-scores)[:top_k]
+            return SimpleNamespace(matches=[
+                SimpleNamespace(
+                    id=ids[i],
+                    score=float(scores[i]),
+                    metadata=dict(self._metadata[ids[i]]) if include_metadata else {}
+                )
+                for i in best
+            ])
+
+    def delete(self, ids: List[str]):
+        self.faults("delete")
+        with self._lock:
+            for article_id in ids:
+                self._vectors.pop(article_id, None)
+                self._metadata.pop(article_id, None)
+
+
+class FakePineconeClient:
+    """Pinecone client holding FakePineconeIndex instances by name."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.faults = _Faults(latency, error_rate, seed)
+        self._indexes: Dict[str, FakePineconeIndex] = {}
+
+    def list_indexes(self):
+        names = list(self._indexes)
+        return SimpleNamespace(names=lambda: names)
+
+    def create_index(self, name: str, dimension: int, metric: str, spec: Any):
+        self._indexes[name] = FakePineconeIndex(self.faults)
+
+    def Index(self, name: str) -> FakePineconeIndex:
+        return self._indexes.setdefault(name, FakePineconeIndex(self.faults))
+
+
+class FakeGroqClient:
+    """Groq client that answers analysis and batch summary prompts with JSON and other prompts with a summary."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.faults = _Faults(latency, error_rate, seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @staticmethod
+    def respond(prompt: str) -> str:
+        sections = re.split(r"^\[(\d+)\] ", prompt, flags=re.MULTILINE)
+        if len(sections) > 1:
+            # A batch summary: the content of each numbered article, shortened
+            summaries = {}
+            for number, section in zip(sections[1::2], sections[2::2]):
+                content = section.split("\n\nPlease provide", 1)[0].split("Content: ", 1)[-1]
+                summaries[number] = " ".join(content.split()[:40])
+            return "```json\n" + json.dumps(summaries) + "\n```"
+        titles = re.findall(r"^Title: (.*)$", prompt, re.MULTILINE)
+        if "Format the response as a JSON" in prompt:
+            words = sorted({word for title in titles for word in WORD_PATTERN.findall(title.lower()) if len(word) > 5})
+            return "```json\n" + json.dumps({
+                "themes": words[:3],
+                "insights": [f"{len(titles)} related articles"],
+                "implications": words[3:5],
+                "related_areas": words[5:8]
+            }) + "\n```"
+        content = re.search(r"^Content: (.*)$", prompt, re.MULTILINE)
+        text = content.group(1) if content else prompt
+        return " ".join(text.split()[:40])
+
+    def _create(self, messages: List[Dict[str, str]], model: str, temperature: float = 0.0,
+                max_tokens: int = 0, stream: bool = False, **kwargs):
+        content = self.respond(messages[-1]["content"])
+        # Whitespace-separated words stand in for tokens
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(message["content"].split()) for message in messages),
+            completion_tokens=len(content.split())
+        )
+        if stream:
+            return self._stream(content, usage)
+        self.faults("chat.completions.create")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def _stream(self, content: str, usage: SimpleNamespace):
+        """Yield the completion a word at a time, spreading the latency over the words like token generation."""
+        if self.faults.draw():
+            raise FakeServiceError("Simulated chat.completions.create failure")
+        pieces = re.findall(r"\s*\S+", content) or [""]
+        for i, piece in enumerate(pieces):
+            if self.faults.latency:
+                time.sleep(self.faults.latency / len(pieces))
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))],
+                x_groq=SimpleNamespace(usage=usage) if i == len(pieces) - 1 else None
+            )
+
+
+def build_rss(source: str, articles: List[Dict[str, Any]]) -> bytes:
+    """Render articles as an RSS 2.0 document that feedparser parses back into the same fields."""
+    items = []
+    for article in articles:
+        categories = "".join(f"<category>{escape(c)}</category>" for c in article.get("categories", []))
+        items.append(
+            "<item>"
+            f"<title>{escape(article['title'])}</title>"
+            f"<link>{escape(article.get('link', ''))}</link>"
+            f"<guid isPermaLink=\"false\">{escape(article['id'])}</guid>"
+            f"<pubDate>{escape(article.get('published', ''))}</pubDate>"
+            f"<description>{escape(article.get('raw_content', article.get('content', '')))}</description>"
+            f"{categories}"
+            "</item>"
+        )
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        f"<rss version=\"2.0\"><channel><title>{escape(source)}</title>{''.join(items)}</channel></rss>"
+    ).encode("utf-8")
+
+
+class FeedServer:
+    """httpx transport that serves RSS documents by URL and honours If-None-Match."""
+
+    def __init__(self, feeds: Dict[str, bytes], latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.feeds = feeds
+        self.faults = _Faults(latency, error_rate, seed)
+        self.transport = httpx.MockTransport(self._handle)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        fail = self.faults.draw()
+        if self.faults.latency:
+            await asyncio.sleep(self.faults.latency)
+        if fail:
+            return httpx.Response(503)
+        body = self.feeds.get(str(request.url))
+        if body is None:
+            return httpx.Response(404)
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, content=body, headers={"ETag": etag, "Content-Type": "application/rss+xml"})
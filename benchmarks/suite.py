@@ -0,0 +1,375 @@
+"""Offline benchmark and load-test suite for the news pipeline and API.
+
+Replays the saved data/raw_news snapshots through the real NewsFetcher,
+AsyncNewsService and FastAPI app with deterministic fakes for Cohere,
+Pinecone, Groq and the RSS feeds, and prints a JSON report. Everything runs
+in a temporary working directory, so the repository's data is never touched.
+
+    python benchmarks/suite.py [--output report.json] [--baseline old.json]
+
+With ``--baseline`` the run exits with status 1 when a latency or duration
+got worse, or a throughput dropped, by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from urllib.parse import quote
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeCohereClient, FakeGroqClient, FakePineconeClient, FeedServer, build_rss  # noqa: E402
+
+FEED_BASE_URL = "https://feeds.bench.invalid"
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1e3
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1e3,
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1e3
+    }
+
+
+def load_snapshots(raw_dir: str, scale: int) -> List[Dict[str, Any]]:
+    """Return the unique articles of every raw snapshot, replicated ``scale`` times under new ids."""
+    articles: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(glob.glob(os.path.join(raw_dir, "raw_news_*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for article in json.load(f):
+                articles[article["id"]] = article
+    replicated = []
+    for copy in range(scale):
+        for article in articles.values():
+            if copy:
+                article = {**article, "id": f"{article['id']}-copy{copy}", "title": f"{article['title']} ({copy})"}
+            replicated.append(article)
+    return replicated
+
+
+def build_feeds(articles: List[Dict[str, Any]]) -> Dict[str, bytes]:
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for article in articles:
+        by_source.setdefault(article.get("source", "Unknown"), []).append(article)
+    return {
+        f"{FEED_BASE_URL}/{index}.xml": build_rss(source, source_articles)
+        for index, (source, source_articles) in enumerate(sorted(by_source.items()))
+    }
+
+
+def bench_clean_html(news_fetcher, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import html_cleaner
+
+    contents = [article.get("raw_content", "") for article in articles]
+    html_cleaner._cache._entries.clear()
+    start = time.perf_counter()
+    for content in contents:
+        news_fetcher.clean_html_content(content)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for content in contents:
+        news_fetcher.clean_html_content(content)
+    cached = time.perf_counter() - start
+    return {
+        "documents": len(contents),
+        "cold_seconds": cold,
+        "cold_documents_per_second": len(contents) / cold if cold else 0.0,
+        "cached_seconds": cached,
+        "cached_documents_per_second": len(contents) / cached if cached else 0.0
+    }
+
+
+def bench_ingest(news_fetcher) -> Dict[str, Any]:
+    report = {}
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        result = news_fetcher.process()
+        elapsed = time.perf_counter() - start
+        changed = result.get("new_count", 0) + result.get("updated_count", 0)
+        report[run] = {
+            "status": result.get("status"),
+            "seconds": elapsed,
+            "articles_fetched": result.get("article_count", 0),
+            "articles_ingested": changed,
+            "ingested_per_second": changed / elapsed if elapsed else 0.0,
+            "stages": result.get("timings", {})
+        }
+    return report
+
+
+def bench_summaries(groq, articles: List[Dict[str, Any]], count: int) -> Dict[str, Any]:
+    """Summarize the same articles one per call and packed into batches, both without the response cache."""
+    from concurrent.futures import ThreadPoolExecutor
+    from config import config
+    from recommender import NewsRecommender, SUMMARY_FALLBACK
+
+    recommender = NewsRecommender(groq_client=groq, cache=None)
+    sample = [article for article in articles if article.get("content")][:count]
+
+    def single() -> List[str]:
+        # How ingest summarized before batching: one call per article on summary_workers threads
+        with ThreadPoolExecutor(max_workers=config.summary_workers) as executor:
+            return list(executor.map(recommender.generate_summary, sample))
+
+    report = {"articles": len(sample)}
+    runs = {"single": single, "batched": lambda: recommender.summarize_many(sample)}
+    for name, summarize in runs.items():
+        calls = groq.faults.calls
+        start = time.perf_counter()
+        summaries = summarize()
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            "seconds": elapsed,
+            "llm_calls": groq.faults.calls - calls,
+            "summarized": sum(1 for summary in summaries if summary != SUMMARY_FALLBACK)
+        }
+    return report
+
+
+async def bench_search(service, articles: List[Dict[str, Any]], queries: int) -> Dict[str, Any]:
+    from query_cache import QueryCache
+
+    titles = [article["title"] for article in articles[:queries]]
+    workloads = {
+        "short": [" ".join(title.split()[:2]) for title in titles],
+        "long": titles
+    }
+    report: Dict[str, Any] = {}
+    query_cache = service.query_cache
+    for cached in (False, True):
+        service.query_cache = QueryCache() if cached else None
+        for workload, texts in workloads.items():
+            for mode in ("auto", "lexical", "vector", "hybrid"):
+                # The cached pass runs every query twice and measures the repeat
+                if cached:
+                    for text in texts:
+                        await service.search_articles(text, mode=mode)
+                samples = []
+                for text in texts:
+                    start = time.perf_counter()
+                    await service.search_articles(text, mode=mode)
+                    samples.append(time.perf_counter() - start)
+                report[f"{'cached' if cached else 'uncached'}.{workload}.{mode}"] = percentiles(samples)
+    service.query_cache = query_cache
+    return report
+
+
+async def bench_load(app, lifespan, articles: List[Dict[str, Any]], requests: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    paths = {
+        "fetch-news": ["/fetch-news?token=bench"] * requests,
+        "recommend-news": [
+            f"/recommend-news?token=bench&query={quote(articles[i % len(articles)]['title'])}"
+            for i in range(requests)
+        ],
+        "article": [
+            f"/article/{quote(articles[i % len(articles)]['id'], safe='')}?token=bench"
+            for i in range(requests)
+        ],
+        "api-articles": ["/api/v1/articles?token=bench&limit=60"] * requests,
+        "api-search": [
+            f"/api/v1/search?token=bench&q={quote(articles[i % len(articles)]['title'])}"
+            for i in range(requests)
+        ]
+    }
+    report: Dict[str, Any] = {}
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for endpoint, urls in paths.items():
+                semaphore = asyncio.Semaphore(concurrency)
+                samples: List[float] = []
+                statuses: Dict[str, int] = {}
+                downloaded: List[int] = []
+
+                async def call(url: str):
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await client.get(url)
+                        samples.append(time.perf_counter() - start)
+                        downloaded.append(response.num_bytes_downloaded)
+                        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*[call(url) for url in urls])
+                elapsed = time.perf_counter() - start
+                report[endpoint] = {
+                    **percentiles(samples),
+                    "requests_per_second": len(urls) / elapsed if elapsed else 0.0,
+                    "response_bytes": sum(downloaded) / len(downloaded) if downloaded else 0.0,
+                    "status_codes": statuses
+                }
+    return report
+
+
+def flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List metrics that regressed by more than ``tolerance`` against the baseline."""
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for name, old in previous.items():
+        new = current.get(name)
+        if new is None or not old or name.startswith("meta."):
+            continue
+        if name.endswith("max_ms"):
+            continue
+        # Sub-millisecond differences are timer noise, not regressions
+        slower = new - old > (1.0 if name.endswith("_ms") else 0.001)
+        if name.endswith(("_ms", "seconds")) and slower and new > old * (1 + tolerance):
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g}")
+        elif name.endswith("per_second") and new < old * (1 - tolerance):
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g}")
+    return regressions
+
+
+def main():
+    # The app prints diagnostics to stdout, keep it for the JSON report only
+    with contextlib.redirect_stdout(sys.stderr):
+        report, regressions = run()
+    print(json.dumps(report, indent=2))
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--raw-dir", default=os.path.join(REPO_ROOT, "data", "raw_news"))
+    parser.add_argument("--scale", type=int, default=1, help="Replicate the snapshot articles this many times")
+    parser.add_argument("--backend", choices=("local", "pinecone"), default="local",
+                        help="Vector store: the local index or VectorStore over a fake Pinecone client")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--summaries", type=int, default=100, help="Articles summarized by the summary benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint in the load test")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--vector-latency", type=float, default=0.02)
+    parser.add_argument("--vector-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--feed-latency", type=float, default=0.1)
+    parser.add_argument("--feed-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report to this file")
+    parser.add_argument("--baseline", help="Report of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    # Resolve paths before switching to the temporary working directory
+    for name in ("raw_dir", "output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    articles = load_snapshots(args.raw_dir, args.scale)
+    if not articles:
+        parser.error(f"No raw_news_*.json snapshots found in {args.raw_dir}")
+
+    # Relative data paths in config resolve inside the temporary directory
+    workdir = tempfile.mkdtemp(prefix="news-bench-")
+    os.makedirs(os.path.join(workdir, "backend"))
+    os.symlink(os.path.join(BACKEND_DIR, "templates"), os.path.join(workdir, "backend", "templates"))
+    os.chdir(workdir)
+    os.environ.update({
+        "VECTOR_BACKEND": args.backend,
+        "COHERE_API_KEY": "offline",
+        "GROQ_API_KEY": "offline",
+        "PINECONE_API_KEY": "offline",
+        "API_TOKEN": "bench",
+        "INGEST_INTERVAL_SECONDS": "0",
+        "WARMUP_ON_STARTUP": "false"
+    })
+
+    from config import config
+    config.embedding_retry_backoff = 0.01
+    config.pinecone_upsert_retry_backoff = 0.01
+    config.embedding_requests_per_minute = 1_000_000
+
+    import_start = time.perf_counter()
+    import clients
+    import components
+    import main as app_module
+    import_seconds = time.perf_counter() - import_start
+
+    # Installed before anything is built, so every component shares the fakes
+    cohere = FakeCohereClient(config.vector_dimension, args.embed_latency, args.embed_error_rate, args.seed)
+    groq = FakeGroqClient(args.llm_latency, args.llm_error_rate, args.seed)
+    pinecone = FakePineconeClient(args.vector_latency, args.vector_error_rate, args.seed)
+    clients.set_client("cohere", cohere)
+    clients.set_client("groq", groq)
+    clients.set_client("pinecone", pinecone)
+    feeds = FeedServer(build_feeds(articles), args.feed_latency, args.feed_error_rate, args.seed)
+    news_fetcher = components.get_news_fetcher()
+    news_fetcher.feeds = list(feeds.feeds)
+    news_fetcher.transport = feeds.transport
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "articles": len(articles),
+            "settings": {
+                key: value for key, value in vars(args).items() if key not in ("raw_dir", "output", "baseline")
+            }
+        }
+    }
+    report["startup"] = {"import_seconds": import_seconds}
+    report["clean_html"] = bench_clean_html(news_fetcher, articles)
+    report["ingest"] = bench_ingest(news_fetcher)
+    report["summaries"] = bench_summaries(groq, articles, args.summaries)
+    report["search"] = asyncio.run(bench_search(components.get_service(), articles, args.queries))
+    report["load"] = asyncio.run(
+        bench_load(app_module.app, app_module.lifespan, articles, args.requests, args.concurrency)
+    )
+    report["fakes"] = {
+        "cohere": cohere.faults.stats(),
+        "groq": groq.faults.stats(),
+        "feeds": feeds.faults.stats(),
+        "pinecone": pinecone.faults.stats() if args.backend == "pinecone" else None
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+    return report, regressions
+
+
+if __name__ == "__main__":
+    sys.exit(main())